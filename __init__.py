@@ -4,15 +4,33 @@ __name__ = 'DetectiveGame420'
 
 __version__ = 'Pre-Alpha'
 
-__all__ = ['detectivegame']
+__all__ = ['detectivegame', 'dgbatch', 'dgserver']
 
 __date__ = '25 May 2018'
 __author__ = 'Minjun Shin <ohgree@u.sogang.ac.kr>'
 __status__ = 'Prototype'
 
-from detectivegame420.detectivegame import main
+# Submodules are imported on first access, so that importing the package or
+# a single submodule does not pay for the rest of it
+_LAZY_SUBMODULES = ('detectivegame', 'dgbatch', 'dgserver', 'items',
+                    'players', 'professions', 'util')
+
+def __getattr__(name):
+    from importlib import import_module
+
+    if name == 'main':
+        return import_module(__package__ + '.detectivegame').main
+    if name in _LAZY_SUBMODULES:
+        return import_module(__package__ + '.' + name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __package__, name))
+
+def __dir__():
+    return sorted(set(globals()) | {'main'} | set(_LAZY_SUBMODULES))
 
 def test():
+    from detectivegame420.detectivegame import main
+
     import sys
 
     try:
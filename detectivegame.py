@@ -8,17 +8,29 @@ from random import randint as _randint
 
 from detectivegame420.players.dgplayer import DGPlayer
 from detectivegame420.util.dgutil import allocate_jobs_to_players
+from detectivegame420.util.dgevent import DGMessageEvent, default_bus
 from detectivegame420.professions.dgprofession import DGProfessionSet
 from detectivegame420.professions.dgprofessionlist import *
 
 # Constants
 from detectivegame420.util.gamesettings import RANDOM_VOTE, PROFESSIONS
 
+def _say(lines):
+    # Sends *lines* to the console through default_bus, and waits for them to
+    # be written so that they show up before the next input()
+    default_bus.emit(DGMessageEvent('\n'.join(lines)))
+    default_bus.flush()
+
+def _prompt():
+    lines = []
+    for index, prof in enumerate(PROFESSIONS):
+        lines.append('{:>19}: {}'.format(prof.name, index))
+    lines.append('{:>19}: {}'.format('RANDOM', 'Any other numbers'))
+    _say(lines)
+
 def main():
     # Prompt
-    for index, prof in enumerate(PROFESSIONS):
-        print('{:>19}: {}'.format(prof.name, index))
-    print('{:>19}: {}'.format('RANDOM', 'Any other numbers'))
+    _prompt()
 
     # Voting
     vote_result = {}
@@ -42,22 +54,62 @@ def main():
     # Choose killer
     assigned_players[_randint(0, len(assigned_players)-1)].setkiller()
 
+    _show_results(vote_result, assigned_players)
+    return assigned_players
+
+async def amain():
+    """asyncio version of main()
+    
+    Every player name is asked first, and then the votes. Input is read in the
+    default executor so that timers of the players keep running on the event
+    loop while waiting for the console.
+    """
+    # imported here, since asyncio takes longer to import than the rest of
+    # the package altogether
+    import asyncio as _asyncio
+    from detectivegame420.util.dgasync import run_game
+    
+    loop = _asyncio.get_running_loop()
+    console = _asyncio.Lock()
+    
+    async def ainput(prompt):
+        async with console:
+            return await loop.run_in_executor(None, input, prompt)
+    
+    async def ask_vote(player_name):
+        return await ainput('{}\'s vote: '.format(player_name))
+    
+    # Prompt
+    _prompt()
+    
+    # Voting
+    player_num = int(await ainput('Number of players: '))
+    names = []
+    for i in range(player_num):
+        names.append(await ainput('{}th player name: '.format(i+1)))
+    vote_result, assigned_players = await run_game(names, ask_vote)
+    
+    _show_results(vote_result, assigned_players)
+    return assigned_players
+
+def _show_results(vote_result, assigned_players):
     # Print results
     # Before
-    print()
-    print('{:=^79}'.format(' Vote '))
+    lines = ['']
+    lines.append('{:=^79}'.format(' Vote '))
     for player in assigned_players:
         if vote_result[player] == RANDOM_VOTE:
-            print('{:15}-> {}'.format(player.name, 'Random roles'))
+            lines.append('{:15}-> {}'.format(player.name, 'Random roles'))
         else:
-            print('{:15}-> {}'.format(player.name, vote_result[player].name))
-    print()
+            lines.append('{:15}-> {}'.format(player.name,
+                                             vote_result[player].name))
+    lines.append('')
 
     # After
-    print('{:=^79}'.format(' Result '))
+    lines.append('{:=^79}'.format(' Result '))
     for player in assigned_players:
-        print('{:15}-> {}'.format(player.name, player.job.name))
-    print()
+        lines.append('{:15}-> {}'.format(player.name, player.job.name))
+    lines.append('')
 
     # Successful voters
     match = 0
@@ -67,16 +119,17 @@ def main():
         elif vote_result[player] is player.job:
             match += 1
         elif isinstance(vote_result[player], DGProfessionSet):
-            if player.job.name in [j.name for j in vote_result[player].jobs()]:
+            if vote_result[player].odds(player.job):
                 match += 1
-    print('matches: {}'.format(match))
+    lines.append('matches: {}'.format(match))
 
-    # Show killer
-    for p in assigned_players:
-        if p.iskiller:
-            print('Killer: {}'.format(p.name))
-
-    return assigned_players
+    # Show killer, looked up in the registry of the table of the players,
+    # which may hold players of other games as well
+    if assigned_players:
+        for p in assigned_players[0].table.registry.killers():
+            if p in vote_result:
+                lines.append('Killer: {}'.format(p.name))
+    _say(lines)
 
 # Self-test code
 if __name__ == '__main__':
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Headless batch driver of the planned plugin DetectiveGame420
+
+Replays recorded lobbies without any prompt:
+
+    python -m detectivegame420.dgbatch [FILE] [--format jsonl|csv]
+                                       [--output FILE] [--text|--throughput]
+
+Lobbies are read from FILE, or stdin if FILE is omitted or '-'. A JSONL
+lobby is a line like
+
+    {"id": "lobby-1", "players": [{"name": "OhGree", "vote": 0}, ...]}
+
+and a CSV file has a header of lobby,name,vote with the rows of each lobby
+next to each other. A vote is an index in PROFESSIONS, anything else being a
+random vote.
+
+Lobbies flow through a generator pipeline and are allocated in chunks, so
+memory stays bounded regardless of the number of lobbies.
+"""
+
+__all__ = ['read_jsonl', 'read_csv', 'run_lobbies', 'render_jsonl',
+           'render_text', 'render_throughput', 'main']
+
+# Python default modules
+import csv as _csv
+import json as _json
+import sys as _sys
+from argparse import ArgumentParser as _ArgumentParser
+from itertools import groupby as _groupby, islice as _islice
+from random import randint as _randint, seed as _seed
+
+from detectivegame420.util.dgutil import allocate_jobs_to_lobbies
+from detectivegame420.professions.dgprofession import DGProfessionSet
+from detectivegame420.professions.dgprofessionlist import Unemployed
+
+# Constants
+from detectivegame420.util import gamesettings as _gamesettings
+from detectivegame420.util.gamesettings import RANDOM_VOTE
+
+# number of lobbies allocated at once
+DEFAULT_CHUNK = 1000
+
+
+def _vote(vote):
+    # private! Converts a recorded vote into an index in PROFESSIONS
+    try:
+        vote = int(vote)
+    except (TypeError, ValueError):
+        return RANDOM_VOTE
+    if 0 <= vote < len(_gamesettings.PROFESSIONS):
+        return vote
+    return RANDOM_VOTE
+
+def read_jsonl(f):
+    """Yields (lobby id, names, votes) of every lobby in the JSONL file
+    object *f*. Blank lines are skipped.
+    """
+    for lineno, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        lobby = _json.loads(line)
+        players = lobby['players']
+        yield (lobby.get('id', lineno), [p['name'] for p in players],
+               [_vote(p.get('vote')) for p in players])
+
+def read_csv(f):
+    """Yields (lobby id, names, votes) of every lobby in the CSV file object
+    *f*, which has a header of lobby,name,vote.
+    """
+    rows = _csv.DictReader(f)
+    for lobby_id, players in _groupby(rows, lambda row: row['lobby']):
+        names = []
+        votes = []
+        for row in players:
+            names.append(row['name'])
+            votes.append(_vote(row['vote']))
+        yield lobby_id, names, votes
+
+def run_lobbies(lobbies, chunk=DEFAULT_CHUNK, multiplier=10):
+    """Allocates jobs and chooses a killer for every lobby in *lobbies*, an
+    iterable of (lobby id, names, votes).
+
+    Lobbies are taken *chunk* at a time and passed on to
+    allocate_jobs_to_lobbies().
+
+    Yields (lobby id, names, votes, jobs, killer) of every lobby, *jobs*
+    being a list of DGProfession instances and *killer* the index of the
+    killer in *names*, or None for an empty lobby.
+    """
+    professions = _gamesettings.PROFESSIONS
+    default_profession = Unemployed()
+    lobbies = iter(lobbies)
+    while True:
+        batch = list(_islice(lobbies, chunk))
+        if not batch:
+            return
+        jobs, assignments = allocate_jobs_to_lobbies(
+            professions, default_profession,
+            [votes for lobby_id, names, votes in batch], multiplier)
+        for (lobby_id, names, votes), assignment in zip(batch, assignments):
+            killer = _randint(0, len(names)-1) if names else None
+            yield (lobby_id, names, votes, [jobs[j] for j in assignment],
+                   killer)
+
+def _matches(votes, jobs):
+    # private! Counts players whose vote was honored, the same way as main()
+    professions = _gamesettings.PROFESSIONS
+    match = 0
+    for vote, job in zip(votes, jobs):
+        if vote == RANDOM_VOTE or professions[vote] is job:
+            match += 1
+        elif isinstance(professions[vote], DGProfessionSet):
+            if professions[vote].odds(job):
+                match += 1
+    return match
+
+def render_jsonl(results):
+    """Yields a JSON line for every result of run_lobbies()."""
+    for lobby_id, names, votes, jobs, killer in results:
+        yield _json.dumps({
+            'id': lobby_id,
+            'jobs': [[name, job.name] for name, job in zip(names, jobs)],
+            'killer': None if killer is None else names[killer],
+            'matches': _matches(votes, jobs),
+        }) + '\n'
+
+def render_text(results):
+    """Yields the result of every lobby rendered like main() does."""
+    for lobby_id, names, votes, jobs, killer in results:
+        text = '{:=^79}\n'.format(' {} '.format(lobby_id))
+        for name, job in zip(names, jobs):
+            text += '{:15}-> {}\n'.format(name, job.name)
+        text += 'matches: {}\n'.format(_matches(votes, jobs))
+        if killer is not None:
+            text += 'Killer: {}\n'.format(names[killer])
+        yield text + '\n'
+
+def _job_codes():
+    # private! Returns a dictionary of {<profession ID>: <code>, ...}, a
+    # code being the index of the job in PROFESSIONS, or the index of a
+    # DGProfessionSet and the index of the job in its jobs() joined by a dot.
+    # Profession IDs differ from process to process, while codes do not.
+    codes = {}
+    for index, prof in enumerate(_gamesettings.PROFESSIONS):
+        if isinstance(prof, DGProfessionSet):
+            for member, job in enumerate(prof.jobs()):
+                codes.setdefault(job.id, '{}.{}'.format(index, member))
+        else:
+            codes.setdefault(prof.id, str(index))
+    return codes
+
+def render_throughput(results):
+    """Yields a compact line for every result of run_lobbies(): the lobby
+    id, the comma separated jobs of the players and the index of the killer,
+    separated by tabs.
+    
+    A job is written as its index in PROFESSIONS, or as the index of a
+    DGProfessionSet and the index of the job in its jobs() joined by a dot,
+    such as 1.0 for Serviceman. Jobs not in PROFESSIONS are written as -.
+    """
+    codes = _job_codes()
+    for lobby_id, names, votes, jobs, killer in results:
+        yield '{}\t{}\t{}\n'.format(lobby_id,
+                                     ','.join(codes.get(job.id, '-')
+                                              for job in jobs),
+                                     '' if killer is None else killer)
+
+def main(argv=None):
+    parser = _ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', nargs='?', default='-',
+                        help='lobby file, defaults to stdin')
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help='input format, guessed from the file name if '
+                             'omitted and jsonl for stdin')
+    parser.add_argument('--output', default='-',
+                        help='result file, defaults to stdout')
+    rendering = parser.add_mutually_exclusive_group()
+    rendering.add_argument('--text', action='store_true',
+                           help='render results for humans')
+    rendering.add_argument('--throughput', action='store_true',
+                           help='write compact results without rendering')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK)
+    parser.add_argument('--multiplier', type=int, default=10)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'csv' if args.input.endswith('.csv') else 'jsonl'
+    if args.seed is not None:
+        _seed(args.seed)
+
+    infile = _sys.stdin if args.input == '-' else \
+        open(args.input, newline='' if fmt == 'csv' else None)
+    outfile = _sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        lobbies = read_csv(infile) if fmt == 'csv' else read_jsonl(infile)
+        results = run_lobbies(lobbies, args.chunk, args.multiplier)
+        if args.throughput:
+            lines = render_throughput(results)
+        elif args.text:
+            lines = render_text(results)
+        else:
+            lines = render_jsonl(results)
+        outfile.writelines(lines)
+    finally:
+        if infile is not _sys.stdin:
+            infile.close()
+        if outfile is not _sys.stdout:
+            outfile.close()
+    return 0
+
+if __name__ == '__main__':
+    _sys.exit(main())
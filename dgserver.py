@@ -0,0 +1,708 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Multi-process game server of the planned plugin DetectiveGame420
+
+Hosts many games on one machine:
+
+    python -m detectivegame420.dgserver [--socket PATH] [--workers N]
+
+A supervisor listens on a Unix domain socket and shards games across worker
+processes by their game ID, each worker running its games on an asyncio
+event loop. Workers are checked on every SERVER_HEALTH_INTERVAL seconds, and
+restarted if they die or stop answering. The games of a restarted worker are
+lost.
+
+Every message is a frame of a 4 byte little-endian payload length followed
+by the payload, a JSON array. A request frame holds a batch of requests
+such as
+
+    [["create", "game-1"], ["join", "game-1", "OhGree", 0],
+     ["start", "game-1"], ["health"]]
+
+each being an operation followed by its arguments, the first of which is
+the game ID for every operation but health. The response frame holds a
+[true, <result>] or [false, <error message>] pair per request, in the same
+order. A failing request does not affect the others in its frame.
+
+Operations are the op_* methods of DGGameWorker, and health, answered by
+the supervisor with the last report of every worker. DGClient is a blocking
+client standing in for the Bukkit plugin.
+"""
+
+__all__ = ['DGGameWorker', 'DGSupervisor', 'DGClient', 'encode_frame',
+           'run_worker', 'main']
+
+# Python default modules
+import asyncio as _asyncio
+import json as _json
+import multiprocessing as _multiprocessing
+import os as _os
+import socket as _socket
+import struct as _struct
+import sys as _sys
+import tempfile as _tempfile
+from argparse import ArgumentParser as _ArgumentParser
+from random import randint as _randint
+from shutil import rmtree as _rmtree
+from threading import Thread as _Thread, Event as _Event
+from time import monotonic as _monotonic, process_time as _process_time
+from zlib import crc32 as _crc32
+
+# Modules in current package
+from detectivegame420.players.dgplayer import DGPlayer
+from detectivegame420.players.dgplayertable import DGPlayerTable
+from detectivegame420.util.dgasync import DGAsyncScheduler
+from detectivegame420.util.dgevent import DGEventBus, DGMemorySink
+from detectivegame420.util.dgutil import DGVoteBox
+from detectivegame420.professions.dgprofessionlist import Unemployed
+
+# Constants
+from detectivegame420.util import gamesettings as _gamesettings
+from detectivegame420.util.gamesettings import RANDOM_VOTE, \
+    SERVER_HEALTH_INTERVAL, SERVER_HEALTH_FAILURES, SERVER_MAX_FRAME
+
+# payload length of a frame
+_FRAME = _struct.Struct('<I')
+# DGPlayer methods run by op_act()
+_ACTIONS = ('kill', 'soak', 'wash', 'setbloody', 'setinvisible',
+            'setkiller')
+# seconds a worker has to start listening
+_WORKER_STARTUP = 10.0
+# events kept per game until op_events(), dropping the oldest ones
+_MAX_EVENTS = 1000
+
+
+def encode_frame(messages):
+    """Returns *messages*, a list of requests or responses, as a frame."""
+    payload = _json.dumps(messages, separators=(',', ':')).encode('utf-8')
+    if len(payload) > SERVER_MAX_FRAME:
+        raise ValueError('frame of {} bytes is too large'.format(
+            len(payload)))
+    return _FRAME.pack(len(payload)) + payload
+
+def _decode_payload(payload):
+    # private! Returns the list of messages in *payload* of a frame.
+    messages = _json.loads(payload.decode('utf-8'))
+    if not isinstance(messages, list):
+        raise ValueError('a frame must hold a JSON array')
+    return messages
+
+async def _read_frame(reader):
+    # private! Reads a frame from the asyncio StreamReader *reader*.
+    size, = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    if size > SERVER_MAX_FRAME:
+        raise ValueError('frame of {} bytes is too large'.format(size))
+    return _decode_payload(await reader.readexactly(size))
+
+def _error(exc):
+    # private! Returns the response to a request failed with *exc*
+    return [False, '{0}: {1}'.format(exc.__class__.__name__, exc)]
+
+
+class _DGGame(object):
+    # private! State of a game hosted by DGGameWorker.
+    def __init__(self, scheduler):
+        self.table = DGPlayerTable()
+        self.events = DGMemorySink(_MAX_EVENTS)
+        # events are only handed over by op_events(), so that games do not
+        # start a thread each
+        self.bus = DGEventBus([self.events], interval=None,
+                              maxlen=_MAX_EVENTS)
+        self.votebox = DGVoteBox(_gamesettings.PROFESSIONS, Unemployed())
+        self.scheduler = scheduler
+        # name -> DGPlayer
+        self.players = {}
+
+
+class DGGameWorker(object):
+    """Hosts games in a worker process.
+
+    Every request of a frame is run by handle() in turn, calling the op_*
+    method named by the request. Timers of every game run on the event
+    loop of the worker through a single DGAsyncScheduler.
+    """
+    def __init__(self, loop=None):
+        """*loop* is the event loop running the timers. Defaults to the
+        running loop.
+        """
+        self._scheduler = DGAsyncScheduler(loop)
+        # game ID -> _DGGame
+        self._games = {}
+        self._requests = 0
+        self._started = _monotonic()
+
+    def handle(self, requests):
+        """Runs every request in *requests*, a list of [<operation>,
+        <argument>, ...], and returns a list of their responses.
+        """
+        responses = []
+        for request in requests:
+            self._requests += 1
+            try:
+                if not isinstance(request, list) or not request:
+                    raise ValueError('malformed request')
+                method = getattr(self, 'op_' + str(request[0]), None)
+                if method is None:
+                    raise ValueError('unknown operation {!r}'.format(
+                        request[0]))
+                responses.append([True, method(*request[1:])])
+            except Exception as e:
+                responses.append(_error(e))
+        return responses
+
+    def _game(self, game):
+        # private! Returns the game *game*
+        try:
+            return self._games[game]
+        except KeyError:
+            raise KeyError('no game {!r}'.format(game)) from None
+
+    def _player(self, game, name):
+        # private! Returns the player *name* of the game *game*
+        try:
+            return self._game(game).players[name]
+        except KeyError:
+            raise KeyError('no player {!r} in game {!r}'.format(
+                name, game)) from None
+
+    @staticmethod
+    def _vote(vote):
+        # private! Converts a vote into a value for DGVoteBox
+        professions = _gamesettings.PROFESSIONS
+        try:
+            vote = int(vote)
+        except (TypeError, ValueError):
+            return RANDOM_VOTE
+        if 0 <= vote < len(professions):
+            return professions[vote]
+        return RANDOM_VOTE
+
+    @staticmethod
+    def _jobs(players):
+        # private! Returns {<name>: <job name>, ...} of *players*
+        return {p.name: p.job.name for p in players}
+
+    def op_create(self, game):
+        """Creates the game *game*."""
+        if game in self._games:
+            raise KeyError('game {!r} exists already'.format(game))
+        self._games[game] = _DGGame(self._scheduler)
+
+    def op_close(self, game):
+        """Closes the game *game*, removing every player along with its
+        timers.
+        """
+        state = self._game(game)
+        for player in state.players.values():
+            player.remove()
+        del self._games[game]
+
+    def op_join(self, game, name, vote=None):
+        """Adds the player *name* voting for *vote*, an index in
+        PROFESSIONS, to the game *game*, or changes its vote if it has
+        joined already.
+
+        Returns {<name>: <job name>, ...} of players whose job has changed,
+        which is empty until the game has started.
+        """
+        state = self._game(game)
+        player = state.players.get(name)
+        if player is None:
+            player = DGPlayer(name, scheduler=state.scheduler,
+                              table=state.table, bus=state.bus)
+            state.players[name] = player
+        return self._jobs(state.votebox.vote(player, self._vote(vote)))
+
+    def op_vote(self, game, name, vote):
+        """Changes the vote of the player *name*. Refer to op_join()."""
+        self._player(game, name)
+        return self.op_join(game, name, vote)
+
+    def op_leave(self, game, name):
+        """Removes the player *name* from the game *game*, cancelling its
+        timers and dropping it from the registry of the game at once.
+
+        Returns {<name>: <job name>, ...} of players whose job has changed.
+        """
+        player = self._player(game, name)
+        state = self._games[game]
+        del state.players[name]
+        jobs = self._jobs(state.votebox.withdraw(player))
+        player.remove()
+        return jobs
+
+    def op_start(self, game):
+        """Assigns jobs to the players of the game *game* and chooses a
+        killer. Later joins, leaves and votes repair the jobs they affect.
+
+        Returns {'jobs': {<name>: <job name>, ...}, 'killer': <name>}.
+        """
+        state = self._game(game)
+        if state.votebox.allocated:
+            raise RuntimeError('game {!r} has started already'.format(game))
+        assigned_players = state.votebox.allocate()
+        killer = None
+        if assigned_players:
+            killer = assigned_players[_randint(0, len(assigned_players)-1)]
+            killer.setkiller()
+            killer = killer.name
+        return {'jobs': self._jobs(assigned_players), 'killer': killer}
+
+    def op_act(self, game, name, action, *args):
+        """Calls the DGPlayer method *action*, one of kill, soak, wash,
+        setbloody, setinvisible and setkiller, of the player *name* with
+        *args*.
+        """
+        if action not in _ACTIONS:
+            raise ValueError('unknown action {!r}'.format(action))
+        getattr(self._player(game, name), action)(*args)
+
+    def op_score(self, game, name, score, msg=''):
+        """Adds *score* to the player *name* with an optional *msg*."""
+        self._player(game, name).addscore(int(score), msg)
+
+    def op_state(self, game):
+        """Returns {<name>: {<attribute>: <value>, ...}, ...} of every
+        player in the game *game*.
+        """
+        return {
+            name: {
+                'job': None if p.job is None else p.job.name,
+                'alive': p.alive, 'killer': p.iskiller, 'bloody': p.bloody,
+                'soaked': p.soaked, 'invisible': p.invisible,
+                'sanitation': p.sanitation, 'score': p.score,
+            } for name, p in self._game(game).players.items()
+        }
+
+    def op_find(self, game, flag):
+        """Returns names of players of the game *game* whose *flag*, one of
+        DGPlayerRegistry.FLAGS, is set.
+        """
+        return [p.name
+                for p in self._game(game).table.registry.with_flag(flag)]
+
+    def op_events(self, game):
+        """Returns [<time>, <event type>, <message>] of every event of the
+        game *game* since the last call.
+        """
+        state = self._game(game)
+        state.bus.flush()
+        events = [[e.time, e.__class__.__name__, e.message]
+                  for e in state.events.events]
+        state.events.clear()
+        return events
+
+    def op_health(self):
+        """Returns a report of the load of this worker."""
+        return {
+            'pid': _os.getpid(),
+            'games': len(self._games),
+            'players': sum(len(g.players) for g in self._games.values()),
+            'requests': self._requests,
+            'uptime': _monotonic() - self._started,
+            'cpu': _process_time(),
+            'timers': len(self._scheduler),
+            'lag': self._scheduler.lag.info,
+        }
+
+
+def run_worker(path):
+    """Runs a worker serving DGGameWorker on the Unix socket *path* until
+    the process is killed. The target of the worker processes of
+    DGSupervisor.
+    """
+    _asyncio.run(_serve_worker(path))
+
+async def _serve_worker(path):
+    # private! Serves a DGGameWorker on *path*.
+    worker = DGGameWorker()
+
+    async def serve(reader, writer):
+        try:
+            while True:
+                requests = await _read_frame(reader)
+                writer.write(encode_frame(worker.handle(requests)))
+                await writer.drain()
+        except (_asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await _asyncio.start_unix_server(serve, path)
+    async with server:
+        await server.serve_forever()
+
+
+class _DGWorkerHandle(object):
+    # private! A worker process of DGSupervisor and the connection to it.
+    def __init__(self, number, path, context):
+        self.number = number
+        self.path = path
+        self.restarts = 0
+        self.failures = 0
+        self.report = None
+        self.load = None
+        self.rtt = None
+        self._context = context
+        self._process = None
+        self._reader = self._writer = None
+        self._lock = _asyncio.Lock()
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    async def start(self):
+        if _os.path.exists(self.path):
+            _os.unlink(self.path)
+        self._process = self._context.Process(
+            target=run_worker, args=(self.path,), daemon=True,
+            name='dgserver-worker-{}'.format(self.number))
+        self._process.start()
+        deadline = _monotonic() + _WORKER_STARTUP
+        while True:
+            try:
+                await self._connect()
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if _monotonic() > deadline or not self.alive:
+                    raise RuntimeError('worker {} did not start'.format(
+                        self.number))
+                await _asyncio.sleep(0.05)
+        self.failures = 0
+        self.report = self.load = self.rtt = None
+
+    async def _connect(self):
+        if not self.alive:
+            raise ConnectionError('worker {} is down'.format(self.number))
+        self._reader, self._writer = \
+            await _asyncio.open_unix_connection(self.path)
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def stop(self):
+        self._disconnect()
+        if self._process is not None:
+            process = self._process
+            self._process = None
+            process.terminate()
+            # join() blocks, so wait for it off the event loop
+            await _asyncio.get_running_loop().run_in_executor(
+                None, process.join, 1)
+
+    async def restart(self):
+        await self.stop()
+        self.restarts += 1
+        await self.start()
+
+    async def call(self, requests):
+        # Sends a frame of *requests*, and returns the responses
+        async with self._lock:
+            if self._writer is None:
+                # dropped by a failed call, see below
+                await self._connect()
+            try:
+                self._writer.write(encode_frame(requests))
+                await self._writer.drain()
+                return await _read_frame(self._reader)
+            except BaseException:
+                # failed or cancelled halfway, such as by a timeout, the
+                # response may still come and be read as the response to
+                # the next call, so the connection is dropped before anyone
+                # else can use it
+                self._disconnect()
+                raise
+
+
+class DGSupervisor(object):
+    """Shards games across worker processes and serves clients on a Unix
+    socket.
+
+    A frame from a client is split by worker, and the part of each worker
+    is sent on as a single frame, every worker being called at once. The
+    responses are put back in the order of the requests.
+    """
+    def __init__(self, path, workers=None,
+                 health_interval=SERVER_HEALTH_INTERVAL):
+        """*path* is the Unix socket to listen on.
+
+        *workers* is the number of worker processes. Defaults to None, using
+        the number of CPUs.
+
+        *health_interval* is the time in seconds between health checks.
+        """
+        if workers is None:
+            workers = _os.cpu_count() or 1
+        self.path = path
+        self._interval = health_interval
+        self._dir = _tempfile.mkdtemp(prefix='detectivegame420-')
+        # workers are spawned, since forking a process running an event
+        # loop and threads is unsafe
+        context = _multiprocessing.get_context('spawn')
+        self._workers = [
+            _DGWorkerHandle(i, _os.path.join(self._dir,
+                                             'worker-{}.sock'.format(i)),
+                            context) for i in range(workers)
+        ]
+        self._server = None
+
+    def shard(self, game):
+        """Returns the number of the worker hosting the game *game*."""
+        return _crc32(str(game).encode('utf-8')) % len(self._workers)
+
+    async def start(self):
+        """Starts the workers and listens on *path*."""
+        for worker in self._workers:
+            await worker.start()
+        if _os.path.exists(self.path):
+            _os.unlink(self.path)
+        self._server = await _asyncio.start_unix_server(self._serve,
+                                                        self.path)
+        self._monitor = _asyncio.ensure_future(self._check_health())
+
+    async def serve(self):
+        """Starts and serves until cancelled, stopping the workers at the
+        end.
+        """
+        await self.start()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stops the workers and removes the sockets."""
+        if self._server is not None:
+            self._server.close()
+            self._monitor.cancel()
+            self._server = None
+        await _asyncio.gather(*[worker.stop() for worker in self._workers])
+        _rmtree(self._dir, ignore_errors=True)
+        if _os.path.exists(self.path):
+            _os.unlink(self.path)
+
+    async def _serve(self, reader, writer):
+        # private! Serves a client connection
+        try:
+            while True:
+                try:
+                    requests = await _read_frame(reader)
+                except ValueError as e:
+                    writer.write(encode_frame([_error(e)]))
+                    break
+                writer.write(encode_frame(await self.dispatch(requests)))
+                await writer.drain()
+        except (_asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, requests):
+        """Runs *requests*, a list of requests, on the workers hosting their
+        games, and returns a list of their responses.
+        """
+        responses = [None] * len(requests)
+        # worker number -> (positions in requests, requests)
+        batches = {}
+        for pos, request in enumerate(requests):
+            if not isinstance(request, list) or not request:
+                responses[pos] = [False, 'ValueError: malformed request']
+            elif request[0] == 'health':
+                responses[pos] = [True, self.health()]
+            elif len(request) < 2:
+                responses[pos] = [False, 'ValueError: missing game ID']
+            else:
+                positions, batch = batches.setdefault(
+                    self.shard(request[1]), ([], []))
+                positions.append(pos)
+                batch.append(request)
+
+        numbers = list(batches)
+        replies = await _asyncio.gather(
+            *[self._workers[n].call(batches[n][1]) for n in numbers],
+            return_exceptions=True)
+        for number, reply in zip(numbers, replies):
+            positions = batches[number][0]
+            if isinstance(reply, Exception):
+                reply = [_error(reply)] * len(positions)
+            for pos, response in zip(positions, reply):
+                responses[pos] = response
+        return responses
+
+    def health(self):
+        """Returns a list of the last health report of every worker, along
+        with *alive*, *restarts*, *rtt*, the round trip time of the health
+        check in seconds, and *load*, the share of a CPU used since the
+        previous check.
+        """
+        reports = []
+        for worker in self._workers:
+            report = dict(worker.report or {})
+            report.update(worker=worker.number, alive=worker.alive,
+                          restarts=worker.restarts, rtt=worker.rtt,
+                          load=worker.load)
+            reports.append(report)
+        return reports
+
+    async def _check_health(self):
+        # private! Checks on every worker every health interval, restarting
+        # dead or unresponsive ones
+        while True:
+            await _asyncio.sleep(self._interval)
+            for worker in self._workers:
+                try:
+                    if not worker.alive:
+                        await worker.restart()
+                        continue
+                    started = _monotonic()
+                    (ok, report), = await _asyncio.wait_for(
+                        worker.call([['health']]), self._interval)
+                except Exception:
+                    worker.failures += 1
+                    if worker.failures >= SERVER_HEALTH_FAILURES:
+                        try:
+                            await worker.restart()
+                        except Exception:
+                            from traceback import print_exc
+                            print_exc()
+                    continue
+                worker.rtt = _monotonic() - started
+                worker.failures = 0
+                previous = worker.report
+                if previous is not None:
+                    elapsed = report['uptime'] - previous['uptime']
+                    if elapsed > 0:
+                        worker.load = (report['cpu'] -
+                                       previous['cpu']) / elapsed
+                worker.report = report
+
+
+class DGClient(object):
+    """A blocking client of DGSupervisor, standing in for the Bukkit plugin.
+
+    Use batch() to send many requests in a single frame.
+    """
+    def __init__(self, path, timeout=None):
+        """*path* is the Unix socket of the supervisor. *timeout* is the
+        time in seconds to wait for a response, defaulting to forever.
+        """
+        self._sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(path)
+        self._file = self._sock.makefile('rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def batch(self, requests):
+        """Sends *requests*, a list of [<operation>, <argument>, ...], in a
+        single frame, and returns the list of their [<ok>, <result>]
+        responses.
+        """
+        self._sock.sendall(encode_frame(requests))
+        header = self._file.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            raise ConnectionError('connection closed by the server')
+        size, = _FRAME.unpack(header)
+        payload = self._file.read(size)
+        if len(payload) < size:
+            raise ConnectionError('connection closed by the server')
+        return _decode_payload(payload)
+
+    def call(self, operation, *args):
+        """Sends a single request, and returns its result.
+
+        Raises RuntimeError with the error message if the request failed.
+        """
+        (ok, result), = self.batch([[operation] + list(args)])
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+
+def main(argv=None):
+    parser = _ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', default=_os.path.join(
+        _tempfile.gettempdir(), 'detectivegame420.sock'),
+        help='Unix socket to listen on')
+    parser.add_argument('--workers', type=int,
+                        help='number of worker processes, defaults to the '
+                             'number of CPUs')
+    parser.add_argument('--health-interval', type=float,
+                        default=SERVER_HEALTH_INTERVAL)
+    args = parser.parse_args(argv)
+
+    supervisor = DGSupervisor(args.socket, args.workers,
+                              args.health_interval)
+    try:
+        _asyncio.run(supervisor.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# Self-test code
+def _test():
+    from time import sleep
+
+    path = _os.path.join(_tempfile.gettempdir(),
+                         'detectivegame420-test-{}.sock'.format(_os.getpid()))
+    supervisor = DGSupervisor(path, workers=2, health_interval=0.2)
+    loop = _asyncio.new_event_loop()
+    ready = _Event()
+
+    async def serve():
+        await supervisor.start()
+        ready.set()
+        await _asyncio.Event().wait()
+
+    _Thread(target=loop.run_until_complete, args=(serve(),),
+            daemon=True).start()
+    ready.wait()
+
+    with DGClient(path) as client:
+        names = ['OhGree', 'Minjun Shin', 'Alice', 'Bob', 'Carol']
+        requests = []
+        for game in ('game-1', 'game-2'):
+            requests.append(['create', game])
+            requests += [['join', game, name, i]
+                         for i, name in enumerate(names)]
+            requests.append(['start', game])
+        for response in client.batch(requests)[-1::-len(names)-2]:
+            print(response)
+        print(client.call('leave', 'game-1', 'Alice'))
+        client.call('act', 'game-1', 'Bob', 'kill')
+        print(client.call('find', 'game-1', 'alive'))
+        print(client.call('events', 'game-1'))
+        print(client.batch([['state', 'game-3']]))
+        # players who left are gone from the registry at once
+        client.batch([['create', 'game-4']] +
+                     [['join', 'game-4', name] for name in 'abc'] +
+                     [['act', 'game-4', 'b', 'soak'],
+                      ['act', 'game-4', 'c', 'setinvisible', 5],
+                      ['leave', 'game-4', 'b'], ['leave', 'game-4', 'c']])
+        for flag in ('soaked', 'invisible', 'alive'):
+            print(flag, client.call('find', 'game-4', flag))
+        assert client.call('find', 'game-4', 'alive') == ['a']
+        client.batch([['close', game]
+                      for game in ('game-1', 'game-2', 'game-4')])
+        sleep(0.5)
+        for report in client.call('health'):
+            print(report)
+            # closing a game cancels every timer of its players
+            assert report['games'] == 0 and report['timers'] == 0, report
+    _asyncio.run_coroutine_threadsafe(supervisor.stop(), loop).result()
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -1,2 +1,2 @@
 # -*- coding: utf-8 -*-
-__all__ = ['dgitem', 'dgitemlist']
\ No newline at end of file
+__all__ = ['dgitem', 'dgitemindex', 'dgitemlist']
\ No newline at end of file
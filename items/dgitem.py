@@ -8,19 +8,27 @@ __all__ = ['DGItem', 'DGFood', 'InvestigationItem']
 from detectivegame420.util.dgutil import eligible_itemuse
 
 # Constants
-from detectivegame420.util.gamesettings import ITEMUSE_DEFAULT_SCORE
+from detectivegame420.util.gamesettings import ITEMUSE_DEFAULT_SCORE, \
+    SCOREREASON_ITEMUSE
 
 
 class DGItemBase(object):
-    raise NotImplementedError('This class is not yet to be implemented')
-    pass
+    """Not implemented as of now. Raises NotImplementedError if called."""
+    def __init__(self, *args, **kwargs):
+        raise NotImplementedError('This class is not yet to be implemented')
 
 class DGItem(object):
     """A class representing an item in DetectiveGame420
     
     This class is meant to be subclassed, therefore it is not a good idea to
     use this as it is.
+    
+    Instances are slotted, taking 96 bytes each against 352 bytes with a
+    __dict__. Subclasses should declare __slots__ as well.
     """
+    __slots__ = ('_name', '_user_jobs', '_user_job_ids', '_killer_only',
+                 '_discription', '_itemuse_score', '_use_msg', '__weakref__')
+    
     def __init__(self, name, user_jobs=(), killer_only=False,
                  itemuse_score=ITEMUSE_DEFAULT_SCORE, discription=None):
         """Initializing this class with keyword arguments is recommended.
@@ -48,6 +56,7 @@ class DGItem(object):
         """
         self._name = name
         self._user_jobs = user_jobs
+        self._user_job_ids = frozenset(j.id for j in user_jobs)
         self._killer_only = killer_only
         if discription is None:
             discription = ''
@@ -74,6 +83,11 @@ class DGItem(object):
     def user_jobs(self):
         return self._user_jobs
     
+    @property
+    def user_job_ids(self):
+        """Returns a frozenset of the IDs of *user_jobs*."""
+        return self._user_job_ids
+    
     @property
     def killer_only(self):
         return self._killer_only
@@ -112,7 +126,8 @@ class DGItem(object):
         if eligible_itemuse(player, self):
             if self.run_item(player):
                 player.addscore(self._itemuse_score,
-                                self._use_msg.format(name=self._name))
+                                self._use_msg.format(name=self._name),
+                                SCOREREASON_ITEMUSE)
                 
     def run_item(self, player):
         """Runs the item and returns result.
@@ -126,6 +141,8 @@ class DGItem(object):
         
         
 class InvestigationItem(DGItem):
+    __slots__ = ('_inspect_messages',)
+    
     def __init__(self, name, *user_jobs):
         super().__init__(name, user_jobs)
         self._inspect_messages = {}
@@ -140,12 +157,15 @@ class InvestigationItem(DGItem):
     
     
 class DGFood(DGItem):
-    __cooked = False
+    __slots__ = ('_cookedfood', '_food_value', '_rawfood_value',
+                 '_cookedfood_value', '_cooked')
+    
     def __init__(self, rawfood, rawfood_value, cookedfood, cookedfood_value):
         super().__init__(name=rawfood, itemuse_score=0)
         self._cookedfood = cookedfood
         self._food_value = self._rawfood_value = rawfood_value
         self._cookedfood_value = cookedfood_value
+        self._cooked = False
     
     # Override
     def run_item(self, player):
@@ -157,9 +177,9 @@ class DGFood(DGItem):
         self._food_value = self._cookedfood_value
         # itemstack substitution here
         self.make_item()
-        self.__cooked = True
+        self._cooked = True
     
     @property
     def cooked(self):
-        return self.__cooked
+        return self._cooked
         
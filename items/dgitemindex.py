@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the item eligibility index in the planned plugin
+DetectiveGame420"""
+
+__all__ = ['DGItemIndex', 'default_index']
+
+# Python default modules
+from operator import attrgetter as _attrgetter
+from sys import intern as _intern
+
+# Modules in current package
+from detectivegame420.professions.dgprofession import registry as _registry
+
+
+def _name(item):
+    # private! Returns the interned name of an item or a string
+    return _intern(getattr(item, 'name', item))
+
+
+class DGItemIndex(object):
+    """Maps professions to the items they can use.
+
+    A profession can use an item if it is one of the item's user_jobs, or if
+    the item is in the profession's usable_items(). Items without user_jobs
+    can be used by everyone, and killer_only items only by killers, as
+    described in DGItem.__init__().
+
+    Items are keyed by their names, so an index can be built once and queried
+    with any instance of the same item or with the name itself. Professions
+    are keyed by their IDs in DGProfession.registry.
+    """
+    def __init__(self, items=(), professions=()):
+        """*items* is an iterable of DGItem instances and *professions* is an
+        iterable of DGProfession instances to be added to this index.
+        """
+        # item name -> frozenset of profession IDs
+        self._users = {}
+        # profession ID -> frozenset of item names
+        self._usable = {}
+        self._everyone = set()
+        self._killer_only = set()
+        for item in items:
+            self.add_item(item)
+        for prof in professions:
+            self.add_profession(prof)
+
+    def __contains__(self, item):
+        return _name(item) in self._users
+
+    def add_item(self, item):
+        """Adds eligibility rules of *item*, a DGItem instance."""
+        name = _name(item)
+        self._users.setdefault(name, frozenset())
+        if item.killer_only:
+            self._killer_only.add(name)
+        elif not item.user_jobs:
+            self._everyone.add(name)
+        for job in item.user_jobs:
+            self._link(job.id, name)
+
+    def add_profession(self, prof):
+        """Adds every item in usable_items() of *prof*, a DGProfession
+        instance.
+        """
+        self._usable.setdefault(prof.id, frozenset())
+        for item in prof.usable_items():
+            self._users.setdefault(_name(item), frozenset())
+            self._link(prof.id, _name(item))
+
+    def _link(self, profid, itemname):
+        # private! Lets the profession *profid* use the item *itemname*
+        self._users[itemname] = self._users[itemname] | {profid}
+        self._usable[profid] = \
+            self._usable.get(profid, frozenset()) | {itemname}
+
+    def users(self, item):
+        """Returns a frozenset of the IDs of professions listed as users of
+        *item*. Empty for items usable by everyone or killers only.
+        """
+        return self._users.get(_name(item), frozenset())
+
+    def usable_items(self, prof):
+        """Returns a frozenset of the names of items usable by *prof*, not
+        including items usable by everyone or killers only.
+        """
+        return self._usable.get(prof.id, frozenset())
+
+    def can_use(self, player, item):
+        """Returns True if *player* can use *item*, a DGItem instance or an
+        item name. O(1).
+        """
+        name = _name(item)
+        if name in self._killer_only:
+            return player.iskiller
+        if name in self._everyone:
+            return True
+        return player.job is not None and \
+            player.job.id in self._users.get(name, ())
+
+    def eligible_players(self, players, item, alive=True):
+        """Returns a list of players in *players* who can use *item* right
+        now.
+
+        *players* is a list of DGPlayer instances, or a DGPlayerRegistry such
+        as DGPlayerTable.registry. Players in a registry are looked up in its
+        job and flag indexes, taking time in the number of eligible players
+        rather than the number of players, and are returned in row order.
+
+        *alive* leaves out dead players if True, which is the default.
+        """
+        name = _name(item)
+        if hasattr(players, 'with_job'):
+            return self._eligible_registered(players, name, alive)
+        if alive:
+            players = [p for p in players if p.alive]
+        if name in self._killer_only:
+            return [p for p in players if p.iskiller]
+        if name in self._everyone:
+            return list(players)
+        users = self._users.get(name, ())
+        return [p for p in players
+                if p.job is not None and p.job.id in users]
+
+    def _eligible_registered(self, registry, name, alive):
+        # private! eligible_players() on the indexes of *registry*
+        if name in self._killer_only:
+            killers = registry.killers()
+            if alive:
+                return [p for p in killers if p.alive]
+            return killers
+        if name in self._everyone:
+            return registry.alive() if alive else list(registry)
+        flags = ('alive',) if alive else ()
+        players = []
+        for profid in self._users.get(name, ()):
+            players += registry.with_job(_registry[profid], *flags)
+        players.sort(key=_attrgetter('row'))
+        return players
+
+
+_default_index = None
+
+def default_index():
+    """Returns an index built from every item in DGItemList and every
+    profession in DGProfessionList, building it on the first call.
+    """
+    global _default_index
+    if _default_index is None:
+        from detectivegame420.items import dgitemlist
+        from detectivegame420.professions import dgprofessionlist
+
+        _default_index = DGItemIndex(
+            [getattr(dgitemlist, name)() for name in dgitemlist.__all__],
+            [getattr(dgprofessionlist, name)()
+             for name in dgprofessionlist.__all__])
+    return _default_index
+
+# Self-test code
+def _test():
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.professions.dgprofessionlist import Doctor, Police
+
+    index = default_index()
+    players = [DGPlayer('Minjun Shin', Doctor()), DGPlayer('Gree Oh', Police())]
+    print(index.usable_items(Doctor()))
+    print([p.name for p in index.eligible_players(players, 'Autopsy')])
+    print([p.name for p in index.eligible_players(players[0].table.registry,
+                                                  'Autopsy')])
+    print(index.can_use(players[1], 'Body Check'))
+
+if __name__ == '__main__':
+    _test()
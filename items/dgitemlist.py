@@ -9,11 +9,15 @@ from detectivegame420.professions.dgprofessionlist import *
 from detectivegame420.items.dgitem import InvestigationItem
 
 class Investigate(InvestigationItem):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Investigate', Detective(), Police())
         self.discription = 'Investigate the body for clues.'
         
 class Autopsy(InvestigationItem):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Autopsy', Doctor(), Student())
         self.discription = 'Performs autopsy on the body for clues.'
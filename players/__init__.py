@@ -1,2 +1,3 @@
 # -*- coding: utf-8 -*-
-__all__ = ['dgplayer']
+__all__ = ['dgplayer', 'dgplayerregistry', 'dgplayertable', 'dgsanitation',
+           'dgscoreledger']
@@ -6,13 +6,16 @@
 __all__ = ['DGPlayer']
 
 # Python default modules
-from threading import Thread as _Thread
 from random import randint as _randint
 from time import sleep as _sleep
 
 # Modules in current package
 from detectivegame420.util.dgutil import DGDelayedScheduler
-from detectivegame420.professions.dgprofession import DGProfession
+from detectivegame420.util.dgevent import DGScoreEvent, DGDeathEvent, \
+    DGDriedEvent, DGInvisibilityEndEvent, default_bus
+from detectivegame420.players.dgsanitation import get_engine
+from detectivegame420.players.dgplayertable import default_table
+from detectivegame420.professions.dgprofession import DGProfession, registry
 
 # Constants
 from detectivegame420.util.gamesettings import *
@@ -20,62 +23,126 @@ from detectivegame420.util.gamesettings import *
 class DGPlayer(object):
     """A class that represents a player in DetectiveGame420.
     
+    The state of the player is kept in a row of DGPlayerTable, so that
+    operations over every player in a game can run on the table at once.
+    
+    Instances are slotted and hold nothing but references, taking 112 bytes
+    each against 520 bytes with a __dict__. The state itself costs 23 bytes
+    per player in the table.
+    
     *To be implemented: outofbreath functions
     """
-    # thought it'd be cool to have an attribute like this
-    __initialized = False
+    __slots__ = ('_name', '_table', '_row', '_scheduler', '_bus',
+                 '_sanitation_engine', '_soaktimer', '_invisibletimer',
+                 '__initialized', '__weakref__')
     
-    def __init__(self, name, job=None):
+    def __init__(self, name, job=None, scheduler=None, table=None, bus=None):
         """Class initialization.
         
         *name* is the name of the player.
         
         *job* is a DGProfession instance
         
+        *scheduler* runs the timers of this player. Defaults to None, using
+        DGUtil.default_scheduler. Pass a DGAsyncScheduler to run them on an
+        asyncio event loop.
+        
+        *table* is the DGPlayerTable holding the state of this player. Defaults
+        to None, using DGPlayerTable.default_table.
+        
+        *bus* is the DGEventBus receiving messages of this player. Defaults to
+        None, using DGEvent.default_bus.
+        
         Note: *name* must be changed to Player object when implemented in
         DetectiveGame420 java plugin.
         """
+        if table is None:
+            table = default_table
+        # score, breath and every flag but alive start at 0
+        row = table.add_row(_randint(SANITATION_LOWEST_INITVALUE, 99),
+                            -1 if job is None else job.id)
+        self._attach(name, table, row, scheduler, bus)
+        
+    @classmethod
+    def from_row(cls, name, table, row, scheduler=None, bus=None):
+        """Returns a player named *name* viewing *row* of *table*, which
+        already holds the state of the player, such as a restored snapshot.
+        
+        *scheduler* and *bus* are the same as in the constructor.
+        """
+        self = cls.__new__(cls)
+        self._attach(name, table, row, scheduler, bus)
+        return self
+    
+    def _attach(self, name, table, row, scheduler, bus):
+        # private! Initializes the player on *row* of *table*.
+        if bus is None:
+            bus = default_bus
         self._name = name
-        self._job = job
-        self._iskiller = False
-        self._score = 0
-        self._sanitation = _randint(SANITATION_LOWEST_INITVALUE, 99)
-        self._soaked = False
-        self._invisible = False
-        self._breath = 0
-        self._bloody = False
-        self._alive = True
-        # this variable must have no other means of setting its value to False
-        self._bloody_once = False
+        self._table = table
+        self._row = row
+        self._scheduler = scheduler
+        self._bus = bus
+        self._soaktimer = None
+        self._invisibletimer = None
         # sanitation drop start
-        self.__sanitation_fall_thread = _Thread(target=self.__fsanitation)
-        self.__sanitation_fall_thread.setDaemon(True)
-        self.__sanitation_fall_thread.start()
+        self._sanitation_engine = get_engine(scheduler)
+        self._sanitation_engine.register(self)
+        table.registry.add(self)
         self.__initialized = True
         
     def __repr__(self):
         assert self.__initialized, 'DGPlayer.__init__() was not called'
         return '{0}({1}, {2})'.format(self.__class__.__name__,
-                                      repr(self._name), repr(self._job))
+                                      repr(self._name), repr(self.job))
     
     def __del__(self):
-        # TODO: find a way to terminate self.__sanitation_fall_thread
-        pass
-    
-    def __setattr__(self, attr, value):
+        # a fallback for players never removed. __initialized is unset if
+        # __init__() has failed, and _row is None once remove() has run.
         try:
-            super().__setattr__(attr, value)
+            initialized = self.__initialized
         except AttributeError:
-            raise AttributeError('readonly attribute')
+            return
+        if initialized and self._row is not None:
+            self._table.release(self._row)
+    
+    def remove(self):
+        """Removes the player from the game at once: cancels its timers,
+        stops its sanitation drop and releases its row, dropping it from the
+        registry of its table. Does nothing if already removed.
+        
+        The player must not be used afterwards.
+        """
+        if self._row is None:
+            return
+        if self._soaktimer is not None:
+            self._soaktimer.cancel()
+            self._soaktimer = None
+        if self._invisibletimer is not None:
+            self._invisibletimer.cancel()
+            self._invisibletimer = None
+        self._sanitation_engine.unregister(self)
+        self._table.remove(self)
+        self._row = None
+    
+    @property
+    def table(self):
+        return self._table
+    
+    @property
+    def row(self):
+        return self._row
+    
+    @property
+    def id(self):
+        """Returns the number of this player in the table, used as the player
+        ID in the score ledger.
+        """
+        return self._table.id[self._row]
     
-    def __delattr__(self, attr):
-        try:
-            super().__delattr__(attr, value)
-        except AttributeError:
-            raise AttributeError('readonly attribute')
     @property
     def alive(self):
-        return self._alive
+        return bool(self._table.alive[self._row])
     
     @property
     def name(self):
@@ -88,17 +155,20 @@ class DGPlayer(object):
         
     @property
     def job(self):
-        return self._job
+        job = self._table.job[self._row]
+        if job < 0:
+            return None
+        return registry[job]
     
     @job.setter
     def job(self, job):
         assert isinstance(job, DGProfession), \
             'job must be a DGProfession instance'
-        self._job = job
+        self._table.set_job(self._row, job.id)
         
     @property
     def iskiller(self):
-        return self._iskiller
+        return bool(self._table.killer[self._row])
     
     def setkiller(self):
         """Sets the player to be a killer.
@@ -106,11 +176,11 @@ class DGPlayer(object):
         This method has no means of knowing whether there's more than one killer
         in the game, so use with caution.
         """
-        self._iskiller = True
+        self._table.set_flag(self._row, 'killer', 1)
         
     @property
     def score(self):
-        return self._score
+        return self._table.score[self._row]
     
     @property
     def bloody(self):
@@ -118,19 +188,19 @@ class DGPlayer(object):
         
         Use setbloody() to set the value to True
         """
-        return self._bloody
+        return bool(self._table.bloody[self._row])
     
     @property
     def bloody_once(self):
-        return self._bloody_once
+        return bool(self._table.bloody_once[self._row])
     
     @property
     def invisible(self):
-        return self._invisible
+        return bool(self._table.invisible[self._row])
     
     @property
     def soaked(self):
-        return self._soaked
+        return bool(self._table.soaked[self._row])
     
     @property
     def sanitationlevel(self):
@@ -141,7 +211,7 @@ class DGPlayer(object):
         2 : mediocre (50 <= sanitation < 75)
         3 : clean    (75 <= sanitation < 100)
         """
-        return self._sanitation // 25
+        return self._table.sanitation[self._row] // 25
     
     @property
     def sanitation(self):
@@ -150,34 +220,34 @@ class DGPlayer(object):
         Worry not, the program will correct itself it the value is out of
         range.
         """
-        return self._sanitation
+        return self._table.sanitation[self._row]
     
     @sanitation.setter
     def sanitation(self, value):
         assert isinstance(value, int), 'value must be an integer'
         self._setsanitation(value)
     
-    def addscore(self, score, msg=''):
+    def addscore(self, score, msg='', reason=SCOREREASON_OTHER):
         """Adds scores to player. Also sends a message to player. No message
         is shown if *score* is 0
         
         *score* is an integer. Can be a negative value.
         
         *msg* is the optional message sent after the score's been applied.
+        
+        *reason* is one of SCOREREASON_* constants, recorded along with
+        *score* in the score ledger of the table.
         """
         if score is 0:
             return None
-        self._score += score
-        score_message = '(To {0}) {1:+}pts'.format(self._name, score)
-        if msg:
-            score_message = score_message + ': ' + msg
-        print(score_message)
+        self._table.add_score((self._row,), score, reason)
+        self._bus.emit(DGScoreEvent(self._name, score, msg, reason))
         
     def _setdry(self):
         # private! This method should not be accessed directly since
         # the drying process must be scheduled only by soak() method.
-        print('{0} is now fully dried'.format(self._name))
-        self._soaked = False
+        self._bus.emit(DGDriedEvent(self._name))
+        self._table.set_flag(self._row, 'soaked', 0)
         
     def _setsanitation(self, value):
         """Safely sets sanitation value
@@ -191,7 +261,7 @@ class DGPlayer(object):
             value = 0
         elif value >= 100:
             value = 99
-        self._sanitation = value
+        self._table.sanitation[self._row] = value
         
     def soak(self):
         """Sets the player's soaked state
@@ -200,18 +270,21 @@ class DGPlayer(object):
         _setdry() method after DRYING_TIME has passed. Also drops sanitation
         based on SANITATIONDROP_SOAK value
         """
-        if not self._soaked:
-            self._soaked = True
-            self._setsanitation(self._sanitation + SANITATIONDROP_SOAK)
+        if not self.soaked:
+            self._table.set_flag(self._row, 'soaked', 1)
+            self._setsanitation(self.sanitation + SANITATIONDROP_SOAK)
             
-        try:
-            self.__soaktimer.cancel()
-        except AttributeError:
-            pass
+        self._startdrying(DRYING_TIME)
+        
+    def _startdrying(self, delay):
+        # private! (Re)schedules _setdry() after *delay* seconds.
+        if self._soaktimer is not None:
+            self._soaktimer.cancel()
         
-        self.__soaktimer = DGDelayedScheduler(target=self._setdry,
-                                             interval=DRYING_TIME)
-        self.__soaktimer.start()
+        self._soaktimer = DGDelayedScheduler(target=self._setdry,
+                                             interval=DRYING_TIME,
+                                             scheduler=self._scheduler)
+        self._soaktimer.start(delay)
         
     def wash(self):
         """Washes the player, adds soaked state and removes bloody state.
@@ -219,7 +292,7 @@ class DGPlayer(object):
         soak() method is called before restoring sanitation, since soak() method
         decreases sanitation. This method won't remove bloody_once state
         """
-        self._bloody = False
+        self._table.set_flag(self._row, 'bloody', 0)
         self.soak()
         self._setsanitation(100)
         
@@ -229,15 +302,15 @@ class DGPlayer(object):
         This method must kill the player in-game, and also set kill flag inside
         this class.
         """
-        if not self._alive:
+        if not self.alive:
             raise RuntimeError('The player is dead already')
         
         # bukkit plugin process goes here
         
-        self._alive = False
+        self._table.set_flag(self._row, 'alive', 0)
         
         # player death message
-        print('{}\'s been killed.'.format(self._name))
+        self._bus.emit(DGDeathEvent(self._name))
         
     def setbloody(self):
         """Sets bloody flag on the player.
@@ -245,42 +318,20 @@ class DGPlayer(object):
         bloody_once is also set to True. This value cannot be set back to False.
         Sanitation is dropped significantly, by SANITATIONDROP_BLOODY
         """
-        if not self._bloody:
-            self._bloody = self._bloody_once = True
-            self._setsanitation(self._sanitation + SANITATIONDROP_BLOODY)
-    
-    def __fsanitation(self):
-        # private! This method should not be called independently. Otherwise
-        # the program will be stuck in a permanent loop
-        """A target method for threading.Thread
-        
-        Drops sanitation with max interval being SANITATION_DROP_INTERVAL. If
-        sanitation value is 0, the score is dropped every maximum ticks of 
-        SCOREDROP_SANITATION_COUNT.
-        """
-        SCOREDROPCOUNT = SCOREDROP_SANITATION_COUNT
-        # To add more randomness, uncomment following:
-        SCOREDROPCOUNT = _randint(0, SCOREDROP_SANITATION_COUNT)
-        while True:
-            #_sleep(SANITATION_DROP_INTERVAL)
-            # To add more randomness, uncomment following:
-            _sleep(_randint(1, SANITATION_DROP_INTERVAL))
-            self._setsanitation(self._sanitation-1)
-            if self._sanitation is 0:
-                SCOREDROPCOUNT -= 1
-                if SCOREDROPCOUNT <= 0:
-                    #SCOREDROPCOUNT = SCOREDROP_SANITATION_COUNT
-                    # To add more randomness, uncomment following:
-                    SCOREDROPCOUNT = _randint(1, SCOREDROP_SANITATION_COUNT)
-                    self.addscore(SANITATION_SCOREDROP,
-                                 'Low sanitation. Use a water tap nearby.')
+        if not self.bloody:
+            self._table.set_flag(self._row, 'bloody', 1)
+            # bloody_once must have no other means of setting its value to 0
+            self._table.set_flag(self._row, 'bloody_once', 1)
+            self._setsanitation(self.sanitation + SANITATIONDROP_BLOODY)
     
     def _setinvisible(self, invisible):
         # private! This method should not be called independently.
         
         # sound effect goes here
         
-        self._invisible = invisible
+        self._table.set_flag(self._row, 'invisible', invisible)
+        if not invisible:
+            self._bus.emit(DGInvisibilityEndEvent(self._name))
     
     def setinvisible(self, time):
         """Sets invisible flag and disables it after *time* seconds have passed.
@@ -290,27 +341,62 @@ class DGPlayer(object):
         durations combined.
         """
         remainingtime = 0
-        try:
-            remainingtime = self.__invisibletimer.remainingrepeats
-            self.__invisibletimer.cancel()
-        except AttributeError:
-            # __invisibletimer has not been set yet.
-            pass
-        except RuntimeError:
-            # __invisibletimer has already been terminated.
-            pass
+        if self._invisibletimer is not None:
+            try:
+                remainingtime = self._invisibletimer.remainingrepeats
+                self._invisibletimer.cancel()
+            except RuntimeError:
+                # _invisibletimer has already been terminated.
+                pass
         
         self._setinvisible(True)
-        self.__invisibletimer = DGDelayedScheduler(target=self._setinvisible,
-                                interval=1, repeat=time+remainingtime,
+        self._startinvisible(time+remainingtime, 1)
+        
+    def _startinvisible(self, repeat, delay):
+        # private! Schedules *repeat* invisible ticks, the first one after
+        # *delay* seconds. Any running invisibility timer must be cancelled.
+        self._invisibletimer = DGDelayedScheduler(target=self._setinvisible,
+                                interval=1, repeat=repeat,
                                 args=(True,), endtarget=self._setinvisible,
-                                eargs=(False,))
-        self.__invisibletimer.start()
+                                eargs=(False,), scheduler=self._scheduler)
+        self._invisibletimer.start(delay)
+        
+    def pendingtimers(self):
+        """Returns a tuple of (drying, invisible, invisible_next) of the
+        timers of this player.
+        
+        *drying* is the time in seconds until the player dries, or None.
+        *invisible* is the number of invisible ticks left, and
+        *invisible_next* the time in seconds until the next one, or None.
+        """
+        drying = None
+        if self._soaktimer is not None:
+            drying = self._soaktimer.remainingtime
+        invisible = 0
+        invisible_next = None
+        if self._invisibletimer is not None:
+            try:
+                invisible = self._invisibletimer.remainingrepeats
+                invisible_next = self._invisibletimer.remainingtime
+            except RuntimeError:
+                pass
+        return drying, invisible, invisible_next
+    
+    def resumetimers(self, drying, invisible, invisible_next):
+        """Restarts timers of this player from the values returned by
+        pendingtimers(), replacing any running ones.
+        """
+        if drying is not None:
+            self._startdrying(drying)
+        if self._invisibletimer is not None:
+            self._invisibletimer.cancel()
+        if invisible_next is not None:
+            self._startinvisible(invisible, invisible_next)
         
 # Self-test code
 def _test():
     p = DGPlayer('OhGree')
-    print(p._DGPlayer__sanitation_fall_thread)
+    print(p._sanitation_engine)
     print(p.sanitation)
     _sleep(10)
     print(p.sanitation)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the player registry in the planned plugin
+DetectiveGame420"""
+
+__all__ = ['DGPlayerRegistry']
+
+# Python default modules
+from collections import deque as _deque
+from threading import Lock as _Lock
+from weakref import WeakValueDictionary as _WeakValueDictionary
+
+
+class DGPlayerRegistry(object):
+    """Indexes the players of a DGPlayerTable by role and state.
+
+    Every table owns a registry as *registry*, which every DGPlayer on the
+    table is added to. Rows are indexed by the flags in FLAGS and by job,
+    and the indexes are kept up to date by DGPlayerTable.set_flag() and
+    set_job(), through which DGPlayer changes its state. Queries therefore
+    take time in the size of their result rather than the number of
+    players.
+
+    Players are dropped from every index at once by remove(), which
+    DGPlayer.remove() calls through DGPlayerTable.remove(). Players are also
+    held by weak references, so that a player never removed is dropped once
+    its row is released by DGPlayer.__del__ as a fallback. Those rows are
+    only queued by discard(), which takes no lock since it runs from the
+    garbage collector in the middle of any other method. The queue is
+    drained by the next method taking the lock.
+    """
+    FLAGS = ('killer', 'alive', 'bloody', 'soaked', 'invisible')
+
+    def __init__(self):
+        # row -> DGPlayer
+        self._players = _WeakValueDictionary()
+        # flag -> set of rows
+        self._flags = {flag: set() for flag in self.FLAGS}
+        # job ID -> set of rows
+        self._jobs = {}
+        # rows released but not yet dropped from the indexes
+        self._discarded = _deque()
+        self._lock = _Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._drain()
+            return len(self._players)
+
+    def __iter__(self):
+        """Yields every registered player in row order."""
+        with self._lock:
+            self._drain()
+            return iter(self._lookup(list(self._players.keys())))
+
+    def __contains__(self, player):
+        with self._lock:
+            self._drain()
+            return self._players.get(player.row) is player
+
+    def add(self, player):
+        """Registers *player*, indexing it by the current state of its row."""
+        table = player.table
+        row = player.row
+        with self._lock:
+            self._drain()
+            self._players[row] = player
+            for flag, rows in self._flags.items():
+                if getattr(table, flag)[row]:
+                    rows.add(row)
+                else:
+                    rows.discard(row)
+            self._unindex_job(row)
+            job = table.job[row]
+            if job >= 0:
+                self._jobs.setdefault(job, set()).add(row)
+
+    def remove(self, player):
+        """Drops *player* from every index at once. Does nothing if *player*
+        is not registered.
+        """
+        row = player.row
+        with self._lock:
+            self._drain()
+            if self._players.get(row) is not player:
+                return
+            del self._players[row]
+            for rows in self._flags.values():
+                rows.discard(row)
+            self._unindex_job(row)
+
+    def discard(self, row):
+        """Drops *row* from every index. The row is only queued, and is
+        dropped by the next method taking the lock.
+        """
+        self._discarded.append(row)
+
+    def _drain(self):
+        # private! Drops every queued row from the indexes. Must hold the
+        # lock.
+        discarded = self._discarded
+        while discarded:
+            row = discarded.popleft()
+            self._players.pop(row, None)
+            for rows in self._flags.values():
+                rows.discard(row)
+            self._unindex_job(row)
+
+    def _unindex_job(self, row):
+        # private! Removes *row* from the job index. Must hold the lock.
+        for job, rows in self._jobs.items():
+            if row in rows:
+                rows.discard(row)
+                if not rows:
+                    del self._jobs[job]
+                return
+
+    def update_flag(self, row, flag, value):
+        """Indexes *row* by *value* of *flag*. Flags not in FLAGS are
+        ignored.
+        """
+        rows = self._flags.get(flag)
+        if rows is not None:
+            if value:
+                rows.add(row)
+            else:
+                rows.discard(row)
+
+    def update_job(self, row, old, new):
+        """Moves *row* from the job ID *old* to *new* in the job index. -1
+        stands for no job.
+        """
+        if old == new:
+            return
+        with self._lock:
+            self._drain()
+            if old >= 0:
+                rows = self._jobs.get(old)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del self._jobs[old]
+            if new >= 0:
+                self._jobs.setdefault(new, set()).add(row)
+
+    def _lookup(self, rows):
+        # private! Returns a list of registered players on *rows*, in row
+        # order. Must hold the lock.
+        players = self._players
+        result = []
+        for row in sorted(rows):
+            player = players.get(row)
+            if player is not None:
+                result.append(player)
+        return result
+
+    def with_flag(self, flag):
+        """Returns a list of players whose *flag*, one of FLAGS, is set."""
+        with self._lock:
+            self._drain()
+            return self._lookup(self._flags[flag])
+
+    def killers(self):
+        return self.with_flag('killer')
+
+    def alive(self):
+        return self.with_flag('alive')
+
+    def bloody(self):
+        return self.with_flag('bloody')
+
+    def soaked(self):
+        return self.with_flag('soaked')
+
+    def invisible(self):
+        return self.with_flag('invisible')
+
+    def with_job(self, job, *flags):
+        """Returns a list of players having *job*, a DGProfession instance,
+        whose *flags* are all set, such as with_job(Doctor(), 'alive').
+        """
+        with self._lock:
+            self._drain()
+            rows = self._jobs.get(job.id, ())
+            for flag in flags:
+                rows = self._flags[flag].intersection(rows)
+            return self._lookup(rows)
+
+    def count(self, flag=None, job=None):
+        """Returns the number of players whose *flag* is set, or having
+        *job*, a DGProfession instance, or both if both are given.
+        """
+        with self._lock:
+            self._drain()
+            if job is None:
+                return len(self._flags[flag])
+            rows = self._jobs.get(job.id, ())
+            if flag is None:
+                return len(rows)
+            return len(self._flags[flag].intersection(rows))
+
+# Self-test code
+def _test():
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.players.dgplayertable import DGPlayerTable
+    from detectivegame420.professions.dgprofessionlist import Doctor, Police
+
+    table = DGPlayerTable()
+    players = [DGPlayer(str(i), (Doctor(), Police())[i % 2], table=table)
+               for i in range(6)]
+    players[1].setkiller()
+    players[2].setbloody()
+    players[4].kill()
+    registry = table.registry
+    print('killers:', registry.killers())
+    print('bloody:', registry.bloody())
+    print('alive doctors:', registry.with_job(Doctor(), 'alive'))
+    print('police:', registry.count(job=Police()))
+    players[2].remove()
+    print('bloody after remove:', registry.bloody(), len(registry))
+
+if __name__ == '__main__':
+    _test()
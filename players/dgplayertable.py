@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the player state table in the planned plugin
+DetectiveGame420"""
+
+__all__ = ['DGPlayerTable', 'default_table']
+
+# Python default modules
+from array import array as _array
+from itertools import compress as _compress
+from threading import Lock as _Lock
+
+# Modules in current package
+from detectivegame420.players.dgscoreledger import DGScoreLedger
+from detectivegame420.players.dgplayerregistry import DGPlayerRegistry
+
+# Constants
+from detectivegame420.util.gamesettings import SCOREREASON_OTHER
+
+# sanitation value -> sanitation level, used with bytes.translate()
+_SANITATIONLEVELS = bytes(min(v, 99) // 25 for v in range(256))
+
+
+class DGPlayerTable(object):
+    """Holds the state of players in columns, one row per player.
+
+    Every column is an array.array, so the state of a whole game sits in a
+    handful of flat buffers instead of one dictionary per player. DGPlayer is
+    a view on a single row of this table. Bulk operations over many players
+    should use the methods of this class instead of going through DGPlayer.
+
+    Columns are:
+
+    *id* being a number given to each player that is never reused, *job*
+    being the ID of the profession in DGProfession.registry or -1,
+    *sanitation* 0 to 99, *score*, *breath*, and the flags *soaked*,
+    *bloody*, *bloody_once*, *invisible*, *alive* and *killer* being 0 or 1.
+
+    Released rows are zeroed and reused by later players.
+
+    Every score change is also recorded in *ledger*, a DGScoreLedger keyed
+    by the *id* column, and players are indexed by role and state in
+    *registry*, a DGPlayerRegistry. Flags and jobs of players must be
+    changed through set_flag() and set_job() to keep *registry* up to date.
+    """
+    COLUMNS = (
+        ('id', 'I'), ('job', 'h'), ('sanitation', 'B'), ('score', 'q'),
+        ('breath', 'h'),
+        ('soaked', 'B'), ('bloody', 'B'), ('bloody_once', 'B'),
+        ('invisible', 'B'), ('alive', 'B'), ('killer', 'B'),
+    )
+
+    def __init__(self, clock=None):
+        """*clock* is the clock of the score ledger, such as the time()
+        method of a scheduler. Defaults to None, using time.monotonic.
+        """
+        for column, typecode in self.COLUMNS:
+            setattr(self, column, _array(typecode))
+        if clock is None:
+            self.ledger = DGScoreLedger()
+        else:
+            self.ledger = DGScoreLedger(clock)
+        self.registry = DGPlayerRegistry()
+        self._nextid = 0
+        self._free = []
+        self._lock = _Lock()
+
+    @classmethod
+    def from_columns(cls, columns, ledger=None, clock=None):
+        """Returns a table holding *columns*, a dictionary of
+        {<column>: <array.array>, ...} of every column in COLUMNS with the
+        same length. Every row is in use.
+        
+        *ledger* is the DGScoreLedger of the table. Defaults to None, using
+        an empty one on *clock*. Refer to __init__() for *clock*.
+        """
+        self = cls(clock)
+        for column, typecode in cls.COLUMNS:
+            setattr(self, column, _array(typecode, columns[column]))
+        if ledger is not None:
+            self.ledger = ledger
+        self._nextid = max(self.id, default=0)
+        return self
+    
+    def __len__(self):
+        """Returns the number of rows in use."""
+        return len(self.alive) - len(self._free)
+
+    @property
+    def size(self):
+        """Returns the number of rows including released ones."""
+        return len(self.alive)
+
+    def add_row(self, sanitation, job=-1):
+        """Adds a row for a living player with *sanitation* and the job ID
+        *job*, and returns its index.
+        """
+        with self._lock:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self.alive)
+                for column, typecode in self.COLUMNS:
+                    getattr(self, column).append(0)
+            self._nextid += 1
+            self.id[row] = self._nextid
+        self.job[row] = job
+        self.sanitation[row] = sanitation
+        self.alive[row] = 1
+        return row
+
+    def release(self, row):
+        """Zeroes *row* and makes it available for later players.
+
+        Takes no lock, since it is called from DGPlayer.__del__, which the
+        garbage collector may run while this thread holds any lock.
+        """
+        self.registry.discard(row)
+        for column, typecode in self.COLUMNS:
+            getattr(self, column)[row] = 0
+        self.job[row] = -1
+        # list.append() is atomic, and add_row() only pops under the lock
+        self._free.append(row)
+
+    def remove(self, player):
+        """Drops *player* from *registry* at once and releases its row.
+
+        Unlike release(), takes locks, so it must not be called from
+        DGPlayer.__del__.
+        """
+        self.registry.remove(player)
+        self.release(player.row)
+
+    def set_flag(self, row, column, value):
+        """Sets the flag *column* of *row* to *value*, 0 or 1."""
+        getattr(self, column)[row] = value
+        self.registry.update_flag(row, column, value)
+
+    def set_job(self, row, job):
+        """Sets the job of *row* to the profession ID *job*, or -1."""
+        jobs = self.job
+        old = jobs[row]
+        jobs[row] = job
+        self.registry.update_job(row, old, job)
+
+    def rows(self, column):
+        """Returns a list of rows where the flag *column* is set."""
+        flags = getattr(self, column)
+        return list(_compress(range(len(flags)), flags))
+
+    def alive_rows(self):
+        return self.rows('alive')
+
+    def killer_rows(self):
+        return self.rows('killer')
+
+    def job_rows(self, job):
+        """Returns a list of rows of players having the job with the ID
+        *job*.
+        """
+        jobs = self.job
+        return [r for r in range(len(jobs)) if jobs[r] == job]
+
+    def sanitationlevels(self, rows=None):
+        """Returns a bytes object of sanitation levels of *rows*, or of every
+        row if *rows* is None. Refer to DGPlayer.sanitationlevel for levels.
+        """
+        if rows is None:
+            return self.sanitation.tobytes().translate(_SANITATIONLEVELS)
+        sanitation = self.sanitation
+        return bytes(_SANITATIONLEVELS[sanitation[r]] for r in rows)
+
+    def decay_sanitation(self, rows=None, amount=1):
+        """Drops sanitation of *rows*, or of every row if *rows* is None, by
+        *amount* without going below 0.
+
+        Returns a list of rows whose sanitation is 0 afterwards.
+        """
+        sanitation = self.sanitation
+        if rows is None:
+            decay = bytes(max(v - amount, 0) for v in range(256))
+            sanitation[:] = _array('B', sanitation.tobytes().translate(decay))
+            return [r for r in _compress(range(len(sanitation)), self.alive)
+                    if sanitation[r] == 0]
+        filthy = []
+        for r in rows:
+            value = sanitation[r] - amount
+            if value <= 0:
+                value = 0
+                filthy.append(r)
+            sanitation[r] = value
+        return filthy
+
+    def add_score(self, rows, score, reason=SCOREREASON_OTHER):
+        """Adds *score* to every row in *rows*, recording *reason* in the
+        ledger.
+        """
+        scores = self.score
+        ids = self.id
+        record = self.ledger.record
+        for r in rows:
+            scores[r] += score
+            record(ids[r], score, reason)
+
+
+# Table shared by every DGPlayer instance created without a table
+default_table = DGPlayerTable()
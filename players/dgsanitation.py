@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the sanitation engine in the planned plugin
+DetectiveGame420"""
+
+__all__ = ['DGSanitationEngine', 'default_engine', 'get_engine']
+
+# Python default modules
+from threading import Lock as _Lock
+from random import randint as _randint
+from weakref import ref as _ref, WeakKeyDictionary as _WeakKeyDictionary
+
+# Modules in current package
+from detectivegame420.util.dgutil import DGDelayedScheduler
+from detectivegame420.util import dgstats as _dgstats
+
+# Constants
+from detectivegame420.util.gamesettings import SANITATION_DROP_INTERVAL, \
+    SCOREDROP_SANITATION_COUNT, SANITATION_SCOREDROP, SCOREREASON_SANITATION
+
+
+class DGSanitationEngine(object):
+    """Drops sanitation of every registered player on a single timer.
+
+    Players are kept in buckets keyed by the tick they are due on. Every tick
+    the engine takes the whole bucket, drops sanitation of those players by 1
+    and puts them back into a bucket between 1 and SANITATION_DROP_INTERVAL
+    seconds ahead. A player whose sanitation is 0 loses SANITATION_SCOREDROP
+    points every maximum ticks of SCOREDROP_SANITATION_COUNT.
+
+    Players are only weakly referenced, so a player that is no longer used
+    anywhere else drops out of the engine by itself. The timer is cancelled
+    while no player is registered.
+    """
+    def __init__(self, tick=1.0, scheduler=None):
+        """*tick* is the length of a single tick in seconds. Defaults to 1.0
+        
+        *scheduler* is the DGScheduler running the ticks. Defaults to
+        DGUtil.default_scheduler.
+        """
+        self._tick = tick
+        self._scheduler = scheduler
+        self._lock = _Lock()
+        # player -> remaining ticks until the next score drop
+        self._scoredropcount = _WeakKeyDictionary()
+        # tick number -> list of weak references to players
+        self._buckets = {}
+        self._ticknum = 0
+        self._timer = None
+
+    def __len__(self):
+        return len(self._scoredropcount)
+
+    def __contains__(self, player):
+        return player in self._scoredropcount
+
+    def register(self, player):
+        """Starts dropping sanitation of *player*. Registering a player twice
+        has no effect.
+        """
+        with self._lock:
+            if player in self._scoredropcount:
+                return
+            self._scoredropcount[player] = \
+                _randint(0, SCOREDROP_SANITATION_COUNT)
+            self._push(_ref(player))
+            if self._timer is None:
+                # low priority, so that a SHED scheduler skips the decay
+                # rather than player effects when it falls behind
+                self._timer = DGDelayedScheduler(target=self._runtick,
+                                                 interval=self._tick,
+                                                 repeat=None,
+                                                 scheduler=self._scheduler,
+                                                 priority=-1)
+                self._timer.start()
+
+    def unregister(self, player):
+        """Stops dropping sanitation of *player*. Does nothing if *player* has
+        not been registered. The timer is cancelled along with the last
+        player.
+        """
+        with self._lock:
+            self._scoredropcount.pop(player, None)
+            if not self._scoredropcount and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+                self._buckets.clear()
+
+    def _push(self, playerref):
+        # private! must be called with self._lock held.
+        delay = _randint(1, int(SANITATION_DROP_INTERVAL))
+        due = self._ticknum + max(1, round(delay / self._tick))
+        self._buckets.setdefault(due, []).append(playerref)
+
+    def _runtick(self):
+        # private! Drops sanitation of every player due on the current tick.
+        started = _dgstats.start()
+        batch = []
+        with self._lock:
+            if not self._scoredropcount:
+                self._timer.cancel()
+                self._timer = None
+                self._buckets.clear()
+                return
+            self._ticknum += 1
+            for playerref in self._buckets.pop(self._ticknum, ()):
+                player = playerref()
+                if player is not None and player in self._scoredropcount:
+                    batch.append(player)
+                    self._push(playerref)
+
+        # drop sanitation table by table
+        tables = {}
+        for player in batch:
+            tables.setdefault(player.table, {})[player.row] = player
+        filthy = []
+        for table, players in tables.items():
+            for row in table.decay_sanitation(players):
+                filthy.append(players[row])
+        if started is not None:
+            _dgstats.count('sanitation.decayed', len(batch))
+            _dgstats.count('sanitation.filthy', len(filthy))
+            _dgstats.stop('sanitation.tick_seconds', started)
+        if not filthy:
+            return
+
+        scoredrops = []
+        with self._lock:
+            for player in filthy:
+                count = self._scoredropcount.get(player)
+                if count is None:
+                    continue
+                count -= 1
+                if count <= 0:
+                    count = _randint(1, SCOREDROP_SANITATION_COUNT)
+                    scoredrops.append(player)
+                self._scoredropcount[player] = count
+        for player in scoredrops:
+            player.addscore(SANITATION_SCOREDROP,
+                            'Low sanitation. Use a water tap nearby.',
+                            SCOREREASON_SANITATION)
+
+
+# Engine shared by every DGPlayer instance
+default_engine = DGSanitationEngine()
+
+# guards creating engines in get_engine()
+_engines_lock = _Lock()
+
+def get_engine(scheduler=None):
+    """Returns the sanitation engine ticking on *scheduler*, creating one if
+    needed. Returns default_engine if *scheduler* is None.
+    """
+    if scheduler is None:
+        return default_engine
+    # the engine is kept on the scheduler, since it holds a reference to the
+    # scheduler itself and would keep a scheduler used as a weak key alive
+    engine = getattr(scheduler, '_sanitation_engine', None)
+    if engine is None:
+        with _engines_lock:
+            engine = getattr(scheduler, '_sanitation_engine', None)
+            if engine is None:
+                engine = DGSanitationEngine(scheduler=scheduler)
+                scheduler._sanitation_engine = engine
+    return engine
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the score ledger in the planned plugin DetectiveGame420"""
+
+__all__ = ['DGScoreLedger']
+
+# Python default modules
+from array import array as _array
+from bisect import bisect_left as _bisect_left
+from threading import Lock as _Lock
+from time import monotonic as _monotonic
+
+# Constants
+from detectivegame420.util.gamesettings import SCOREREASON_OTHER
+
+
+class DGScoreLedger(object):
+    """Records every score change as (player ID, delta, reason, time).
+
+    Entries are only ever appended, to four parallel array.array columns.
+    Totals per player and per reason are kept up to date on every record(),
+    along with a running sum of deltas that makes window_sum() O(log n) for
+    the whole ledger. An entry takes 25 bytes altogether.
+
+    Times are seconds from the creation of the ledger, as measured by
+    *clock*, and never decrease from one entry to the next.
+    """
+    def __init__(self, clock=_monotonic):
+        """*clock* is a function returning the current time in seconds.
+        Defaults to time.monotonic.
+        """
+        self._clock = clock
+        self._epoch = clock()
+        self.player = _array('I')
+        self.delta = _array('i')
+        self.reason = _array('B')
+        self.time = _array('d')
+        # running sum of deltas, cumsum[i] being the sum of delta[:i]
+        self._cumsum = _array('q', [0])
+        self._totals = {}
+        self._reasons = {}
+        self._lock = _Lock()
+
+    @classmethod
+    def from_entries(cls, player, delta, reason, time, clock=_monotonic):
+        """Returns a ledger holding the entries in the columns *player*,
+        *delta*, *reason* and *time*, such as from a restored snapshot.
+        Entries recorded later on continue from the last time.
+        """
+        self = cls(clock)
+        self.player = _array('I', player)
+        self.delta = _array('i', delta)
+        self.reason = _array('B', reason)
+        self.time = _array('d', time)
+        if self.time:
+            self._epoch -= self.time[-1]
+        cumsum = self._cumsum
+        for p, d, r in zip(self.player, self.delta, self.reason):
+            cumsum.append(cumsum[-1] + d)
+            self._totals[p] = self._totals.get(p, 0) + d
+            self._reasons[r] = self._reasons.get(r, 0) + d
+        return self
+
+    def __len__(self):
+        return len(self.delta)
+
+    @property
+    def nbytes(self):
+        """Returns the number of bytes taken by the entries."""
+        return sum(len(a) * a.itemsize for a in
+                   (self.player, self.delta, self.reason, self.time,
+                    self._cumsum))
+
+    def record(self, player, delta, reason=SCOREREASON_OTHER):
+        """Appends a change of *delta* points to the score of the player with
+        the ID *player*, for *reason*, one of SCOREREASON_* constants.
+        """
+        with self._lock:
+            now = self._clock() - self._epoch
+            if self.time and now < self.time[-1]:
+                now = self.time[-1]
+            self.player.append(player)
+            self.delta.append(delta)
+            self.reason.append(reason)
+            self.time.append(now)
+            self._cumsum.append(self._cumsum[-1] + delta)
+            self._totals[player] = self._totals.get(player, 0) + delta
+            self._reasons[reason] = self._reasons.get(reason, 0) + delta
+
+    def total(self, player):
+        """Returns the sum of score changes of the player with the ID
+        *player*.
+        """
+        return self._totals.get(player, 0)
+
+    def totals(self):
+        """Returns a dictionary of {<player ID>: <sum of changes>, ...}."""
+        return dict(self._totals)
+
+    def by_reason(self, player=None):
+        """Returns a dictionary of {<reason>: <sum of changes>, ...}, of
+        every player if *player* is None, or of the player with the ID
+        *player*.
+        """
+        if player is None:
+            return dict(self._reasons)
+        reasons = {}
+        for p, delta, reason in zip(self.player, self.delta, self.reason):
+            if p == player:
+                reasons[reason] = reasons.get(reason, 0) + delta
+        return reasons
+
+    def _span(self, start, end):
+        # private! Returns the range of entries recorded in [start, end)
+        first = _bisect_left(self.time, start)
+        last = len(self.time) if end is None else \
+            _bisect_left(self.time, end, first)
+        return first, last
+
+    def window_sum(self, start=0.0, end=None, player=None):
+        """Returns the sum of score changes recorded from *start* up to, but
+        not including, *end* seconds, of every player if *player* is None,
+        or of the player with the ID *player*.
+
+        *end* defaults to None, meaning up to now.
+        """
+        first, last = self._span(start, end)
+        if player is None:
+            return self._cumsum[last] - self._cumsum[first]
+        players = self.player
+        delta = self.delta
+        return sum(delta[i] for i in range(first, last)
+                   if players[i] == player)
+
+    def entries(self, player=None, start=0.0, end=None):
+        """Yields (player ID, delta, reason, time) of entries recorded from
+        *start* up to *end* seconds, of every player if *player* is None, or
+        of the player with the ID *player*.
+        """
+        first, last = self._span(start, end)
+        for i in range(first, last):
+            if player is None or self.player[i] == player:
+                yield self.player[i], self.delta[i], self.reason[i], \
+                    self.time[i]
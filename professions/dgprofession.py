@@ -3,21 +3,105 @@
 
 """Demonstration of DGProfession class in the planned plugin DetectiveGame420"""
 
-__all__ = ['DGProfession', 'DGProfessionSet']
+__all__ = ['DGProfession', 'DGProfessionSet', 'DGProfessionRegistry',
+           'registry']
 
 from random import randint as _randint
+from threading import RLock as _RLock
 
 
 class DGNamedObject(object):
     pass
 
 
-class DGProfession(object):
+class DGProfessionRegistry(object):
+    """Hands out a small integer ID to every DGProfession instance.
+    
+    IDs start at 0 and follow the order of creation, so they can be used as
+    indices of arrays. The profession with an ID is looked up in O(1) with
+    registry[id].
+    """
+    def __init__(self):
+        self._professions = []
+        # class -> the single instance of a profession created without
+        # arguments
+        self._interned = {}
+        # reentrant, since intern() holds it while the constructor calls
+        # register()
+        self._lock = _RLock()
+        
+    def __len__(self):
+        return len(self._professions)
+    
+    def __iter__(self):
+        return iter(tuple(self._professions))
+    
+    def __getitem__(self, id_):
+        return self._professions[id_]
+    
+    def register(self, prof):
+        """Registers *prof* and returns its ID."""
+        with self._lock:
+            self._professions.append(prof)
+            return len(self._professions) - 1
+        
+    def intern(self, cls):
+        """Returns the single instance of *cls*, creating it on the first
+        call.
+        """
+        try:
+            return self._interned[cls]
+        except KeyError:
+            pass
+        # created under the lock, so that no racing thread registers an
+        # instance of its own
+        with self._lock:
+            if cls not in self._interned:
+                self._interned[cls] = type.__call__(cls)
+            return self._interned[cls]
+        
+    def interned(self, prof):
+        """Returns True if *prof* is the single instance of its class."""
+        return self._interned.get(prof.__class__) is prof
+    
+    def by_name(self, name):
+        """Returns the first registered profession named *name*."""
+        for prof in self._professions:
+            if prof.name == name:
+                return prof
+        raise KeyError(name)
+    
+    
+# Registry of every DGProfession instance
+registry = DGProfessionRegistry()
+
+
+class _DGProfessionType(type):
+    # private! Metaclass interning professions created without arguments.
+    # Detective() and alike always return the same instance, while
+    # professions created with arguments, such as DGProfessionSet, are new
+    # instances every time.
+    def __call__(cls, *args, **kwargs):
+        if args or kwargs:
+            return super().__call__(*args, **kwargs)
+        return registry.intern(cls)
+    
+    
+class DGProfession(object, metaclass=_DGProfessionType):
     """Represents a profession.
     
     This class is meant to be subclassed. Thus independent use of this class is
     not recommended.
+    
+    A subclass taking no arguments is a flyweight: every call returns the same
+    instance, so professions can be compared with *is* or by their *id*.
+    
+    Instances are slotted, taking 80 bytes each against 352 bytes with a
+    __dict__. Subclasses should declare __slots__ as well.
     """
+    __slots__ = ('_name', '_essential', '_discription', '_usable_items', '_id',
+                 '__weakref__')
+    
     def __init__(self, name, essential=False, discription='',
                                               usable_items=None):
         """Arguments are:
@@ -40,10 +124,32 @@ class DGProfession(object):
         if usable_items is None:
             usable_items = []
         self._usable_items = usable_items
+        self._id = registry.register(self)
         
     def __repr__(self):
         return '{0}()'.format(self.__class__.__name__)
     
+    def __reduce_ex__(self, protocol):
+        # interned professions are unpickled as the interned instance of the
+        # unpickling process
+        if registry.interned(self):
+            return (self.__class__, ())
+        return super().__reduce_ex__(protocol)
+    
+    def __setstate__(self, state):
+        # other professions are given a new ID by the unpickling process.
+        # Slotted instances are pickled with a state of (None, <slots>).
+        if isinstance(state, tuple):
+            state = state[1]
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self._id = registry.register(self)
+    
+    @property
+    def id(self):
+        """Returns the ID given by DGProfessionRegistry."""
+        return self._id
+    
     @property
     def name(self):
         return self._name
@@ -81,6 +187,8 @@ class DGProfessionSet(DGProfession):
     """Represents the set of DGProfession, including the probabilities on
     choosing contained profession.
     """
+    __slots__ = ('_job_odds', '_alias_table')
+    
     def __init__(self, name, job_odds=None, essential=False,
                                             discription=None):
         """The arguments are:
@@ -102,29 +210,73 @@ class DGProfessionSet(DGProfession):
         super().__init__(name, essential, discription)
         if job_odds is None:
             job_odds = {}
-        self._job_odds = job_odds
+        self._job_odds = dict(job_odds)
+        # alias table compiled from _job_odds, None until the first draw
+        self._alias_table = None
     
     def jobs(self):
         """Returns a tuple of all jobs contained in this set."""
         return tuple(self._job_odds.keys())
     
+    def odds(self, job):
+        """Returns the chance of *job* to be chosen, 0 if not in this set."""
+        return self._job_odds.get(job, 0)
+    
+    def set_odds(self, job, odds):
+        """Sets the chance of *job* to be chosen. *job* is removed from this
+        set if *odds* is 0.
+        """
+        assert isinstance(odds, int) and odds >= 0, \
+            'odds must be a non-negative integer'
+        if odds:
+            self._job_odds[job] = odds
+        else:
+            self._job_odds.pop(job, None)
+        self._alias_table = None
+    
+    def _compile(self):
+        # private! Builds an alias table of _job_odds (Vose's method).
+        #
+        # Column i holds jobs[i] with the chance of prob[i]/total and
+        # jobs[alias[i]] with the rest, so a draw is picking a column and
+        # then one of its two jobs. Integer weights keep the chances exact.
+        jobs = tuple(self._job_odds.keys())
+        if not jobs:
+            raise ValueError('no job to choose from')
+        total = sum(self._job_odds.values())
+        scaled = [odds * len(jobs) for odds in self._job_odds.values()]
+        prob = [total] * len(jobs)
+        alias = list(range(len(jobs)))
+        small = [i for i, w in enumerate(scaled) if w < total]
+        large = [i for i, w in enumerate(scaled) if w >= total]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= total - scaled[less]
+            if scaled[more] < total:
+                small.append(more)
+            else:
+                large.append(more)
+        self._alias_table = (jobs, tuple(prob), tuple(alias), total)
+        return self._alias_table
+    
     def choose_job(self):
         """Returns a job, depending on the probability specified."""
-        job_list = self._job_odds.keys()
-        
-        total_odds = 0
-        for odds in self._job_odds.values():
-            total_odds += odds
-        
-        rand_result = _randint(1, total_odds)
-        
-        base = 0
-        for job in job_list:
-            if base < rand_result <= base + self._job_odds[job]:
-                final_job = job
-                break
+        jobs, prob, alias, total = self._alias_table or self._compile()
+        column = _randint(0, len(jobs)-1)
+        if _randint(0, total-1) < prob[column]:
+            return jobs[column]
+        return jobs[alias[column]]
+    
+    def choose_jobs(self, k):
+        """Returns a list of *k* jobs, chosen independently of each other."""
+        jobs, prob, alias, total = self._alias_table or self._compile()
+        chosen = []
+        for i in range(k):
+            column = _randint(0, len(jobs)-1)
+            if _randint(0, total-1) < prob[column]:
+                chosen.append(jobs[column])
             else:
-                base += self._job_odds[job]
-        
-        return final_job
-    
\ No newline at end of file
+                chosen.append(jobs[alias[column]])
+        return chosen
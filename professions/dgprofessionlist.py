@@ -12,6 +12,8 @@ __all__ = [
 from detectivegame420.professions.dgprofession import DGProfession
 
 class Doctor(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Doctor', True)
         self.discription = \
@@ -22,6 +24,8 @@ class Doctor(DGProfession):
         self.add_usable_items(['Autopsy', 'Luminol Solution'])
         
 class Student(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Student', True)
         self.discription = \
@@ -30,6 +34,8 @@ class Student(DGProfession):
         self.add_usable_items(['Autopsy'])
         
 class Detective(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Detective', True)
         self.discription = \
@@ -38,6 +44,8 @@ class Detective(DGProfession):
         self.add_usable_items(['Investigate'])
         
 class Police(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Police', True)
         self.discription = \
@@ -46,6 +54,8 @@ class Police(DGProfession):
         self.add_usable_items(['Investigate', 'Body Check'])
         
 class Engineer(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Engineer', True)
         self.discription = \
@@ -54,6 +64,8 @@ class Engineer(DGProfession):
         self.add_usable_items(['CCTV', 'Ice'])
         
 class Clerk(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Clerk', True)
         self.discription = \
@@ -62,6 +74,8 @@ class Clerk(DGProfession):
         self.add_usable_items(['Googling'])
         
 class Chef(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Chef', True)
         self.discription = \
@@ -70,6 +84,8 @@ class Chef(DGProfession):
         self.add_usable_items(['Chef\'s Kitchen Knife'])
         
 class Serviceman(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Serviceman', True)
         self.discription = \
@@ -79,6 +95,8 @@ class Serviceman(DGProfession):
         self.add_usable_items([])
         
 class DeltaForce(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('DeltaForce', True)
         self.discription = \
@@ -89,6 +107,8 @@ class DeltaForce(DGProfession):
         self.add_usable_items([])
         
 class Unemployed(DGProfession):
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__('Unemployed', True)
         self.discription = \
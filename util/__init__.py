@@ -1,2 +1,3 @@
 # -*- coding: utf-8 -*-
-__all__ = ['dgutil', 'gamesettings']
+__all__ = ['dgasync', 'dgbench', 'dgevent', 'dgsim', 'dgsnapshot', 'dgstats',
+           'dgutil', 'gamesettings']
\ No newline at end of file
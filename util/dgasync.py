@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the asyncio runtime in the planned plugin DetectiveGame420
+"""
+
+__all__ = ['DGAsyncScheduler', 'collect_votes', 'run_game']
+
+# Python default modules
+import asyncio as _asyncio
+from random import randint as _randint
+from traceback import print_exc as _print_exc
+
+# Modules in current package
+from detectivegame420.players.dgplayer import DGPlayer
+from detectivegame420.util.dgutil import DGVoteBox, DGLagMonitor, CATCHUP
+from detectivegame420.professions.dgprofessionlist import Unemployed
+
+# Constants
+from detectivegame420.util import gamesettings as _gamesettings
+from detectivegame420.util.gamesettings import RANDOM_VOTE
+
+
+class DGAsyncScheduler(object):
+    """Runs DGDelayedScheduler timers on an asyncio event loop.
+    
+    This is a drop-in replacement of DGUtil.DGScheduler. Pass it as
+    *scheduler* to DGPlayer or DGDelayedScheduler, and the sanitation, drying
+    and invisibility timers of those players run as loop callbacks instead of
+    on the worker thread. One loop can host any number of games this way.
+    
+    Timers are scheduled on absolute loop times, and how late each one runs
+    is measured in *lag*.
+    """
+    def __init__(self, loop=None, policy=CATCHUP):
+        """*loop* is the event loop running the timers. Defaults to the
+        running loop.
+        
+        *policy* is the overload policy, one of dgutil.CATCHUP, COALESCE and
+        SHED.
+        """
+        if loop is None:
+            loop = _asyncio.get_running_loop()
+        self.policy = policy
+        self.lag = DGLagMonitor()
+        self._loop = loop
+        # timer -> asyncio.TimerHandle
+        self._handles = {}
+        
+    def __len__(self):
+        return len(self._handles)
+    
+    @property
+    def loop(self):
+        return self._loop
+    
+    def time(self):
+        """Returns the current time in seconds, as the loop sees it."""
+        return self._loop.time()
+    
+    def add(self, timer, delay):
+        """Schedules *timer* to fire after *delay* seconds.
+        
+        Can be called from any thread. Rescheduling a timer that is already
+        scheduled moves it.
+        """
+        if not self._inloop():
+            self._loop.call_soon_threadsafe(self.add, timer, delay)
+            return
+        self._schedule(timer, self._loop.time() + delay)
+        
+    def repeat(self, timer, interval):
+        """Schedules *timer* to fire *interval* seconds after the time it was
+        last due on, or after now if it has never been scheduled.
+        """
+        if not self._inloop():
+            self._loop.call_soon_threadsafe(self.repeat, timer, interval)
+            return
+        due = getattr(timer, '_due', None)
+        if due is None:
+            due = self._loop.time()
+        self._schedule(timer, due + interval)
+        
+    def late(self, timer):
+        """Returns the time in seconds *timer* is running behind the time
+        it was due on. Meant to be called while *timer* fires.
+        """
+        due = getattr(timer, '_due', None)
+        if due is None:
+            return 0.0
+        return max(0.0, self._loop.time() - due)
+    
+    def _schedule(self, timer, due):
+        # private! must be called from the loop.
+        self._discard(timer)
+        timer._due = due
+        self._handles[timer] = self._loop.call_at(due, self._fire, timer)
+        
+    def remove(self, timer):
+        """Removes *timer* if it has been scheduled."""
+        if not self._inloop():
+            self._loop.call_soon_threadsafe(self.remove, timer)
+            return
+        self._discard(timer)
+        
+    def remaining(self, timer):
+        """Returns the time in seconds until *timer* fires, or None if it has
+        not been scheduled.
+        """
+        handle = self._handles.get(timer)
+        if handle is None:
+            return None
+        return max(0.0, handle.when() - self._loop.time())
+        
+    def _inloop(self):
+        # private! True if called from the thread running self._loop
+        try:
+            return _asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+        
+    def _discard(self, timer):
+        # private! must be called from the loop.
+        handle = self._handles.pop(timer, None)
+        if handle is not None:
+            handle.cancel()
+            
+    def _fire(self, timer):
+        # private! Called by the loop when *timer* is due.
+        self._handles.pop(timer, None)
+        self.lag.record(self.late(timer))
+        try:
+            timer._fire()
+        except Exception:
+            _print_exc()
+            
+            
+def _parse_vote(vote):
+    # private! Converts a vote into a value of vote_result
+    try:
+        vote = int(vote)
+    except (TypeError, ValueError):
+        return RANDOM_VOTE
+    professions = _gamesettings.PROFESSIONS
+    if 0 <= vote < len(professions):
+        return professions[vote]
+    return RANDOM_VOTE
+
+async def collect_votes(names, ask_vote, timeout=None, scheduler=None,
+                        votebox=None):
+    """Collects votes of every player at once.
+    
+    *names* is an iterable of player names.
+    
+    *ask_vote* is a coroutine function called with a player name, returning
+    the index of the voted profession in PROFESSIONS. Any other value, an
+    exception or not answering in time counts as RANDOM_VOTE.
+    
+    *timeout* is the time in seconds each player has to vote. Defaults to
+    None, waiting forever.
+    
+    *scheduler* is passed on to each DGPlayer created.
+    
+    *votebox* is an optional DGVoteBox, which every vote is filed in as
+    soon as it comes in.
+    
+    Returns a vote dictionary for allocate_jobs_to_players().
+    """
+    players = [DGPlayer(name, scheduler=scheduler) for name in names]
+    
+    async def ask(player):
+        try:
+            vote = await _asyncio.wait_for(ask_vote(player.name), timeout)
+        except _asyncio.TimeoutError:
+            vote = RANDOM_VOTE
+        except Exception:
+            _print_exc()
+            vote = RANDOM_VOTE
+        else:
+            vote = _parse_vote(vote)
+        if votebox is not None:
+            votebox.vote(player, vote)
+        return vote
+    
+    votes = await _asyncio.gather(*[ask(p) for p in players])
+    return dict(zip(players, votes))
+
+async def run_game(names, ask_vote, timeout=None, scheduler=None):
+    """Runs the vote, job allocation and killer selection of a single game.
+    
+    Arguments are the same as collect_votes(). *scheduler* defaults to a new
+    DGAsyncScheduler on the running loop.
+    
+    Returns a tuple of the vote dictionary and the list of assigned players.
+    """
+    if scheduler is None:
+        scheduler = DGAsyncScheduler()
+    votebox = DGVoteBox(_gamesettings.PROFESSIONS, Unemployed())
+    vote_result = await collect_votes(names, ask_vote, timeout, scheduler,
+                                      votebox)
+    assigned_players = votebox.allocate()
+    assigned_players[_randint(0, len(assigned_players)-1)].setkiller()
+    return vote_result, assigned_players
+
+# Self-test code
+def _test():
+    async def ask_vote(name):
+        await _asyncio.sleep(0.1)
+        return len(name) % len(_gamesettings.PROFESSIONS)
+    
+    async def game():
+        names = ['Minjun Shin', 'Gree Oh', 'Alice', 'Bob', 'Carol', 'Dave',
+                 'Erin', 'Frank']
+        vote_result, players = await run_game(names, ask_vote, timeout=1)
+        for p in players:
+            print(p.name, p.job.name, p.iskiller)
+        players[0].setinvisible(1)
+        print(players[0].invisible)
+        await _asyncio.sleep(1.5)
+        print(players[0].invisible)
+        
+    _asyncio.run(game())
+    
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the hot paths in the planned plugin DetectiveGame420
+
+Run as a module to benchmark every registered case:
+
+    python -m detectivegame420.util.dgbench [--sizes 10 1000] [--save FILE]
+                                            [--baseline FILE] [--imports]
+
+Each case is timed with a fresh setup per size. The best and the median of
+*repeat* runs are reported along with the peak memory allocated during a
+single run, as measured by tracemalloc. Results can be saved as JSON and
+compared against a saved baseline later on.
+
+--imports measures the time to import modules of the package in a fresh
+interpreter instead, failing if any exceeds its budget in IMPORT_BUDGETS.
+"""
+
+__all__ = [
+    'BENCHMARKS', 'IMPORT_BUDGETS', 'benchmark', 'run_benchmarks', 'compare',
+    'measure_import', 'check_import_budgets',
+]
+
+# Python default modules
+import json as _json
+import os as _os
+import subprocess as _subprocess
+import sys as _sys
+import tracemalloc as _tracemalloc
+from argparse import ArgumentParser as _ArgumentParser
+from random import randint as _randint, seed as _seed
+from statistics import median as _median
+from timeit import default_timer as _timer
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+# relative slowdown from the baseline reported as a regression
+DEFAULT_TOLERANCE = 0.2
+
+# name -> setup function taking a size and returning the callable to time
+BENCHMARKS = {}
+
+# module -> seconds allowed for importing it in a fresh interpreter
+IMPORT_BUDGETS = {
+    'detectivegame420': 0.010,
+    'detectivegame420.util.dgutil': 0.050,
+    'detectivegame420.players.dgplayer': 0.060,
+    'detectivegame420.detectivegame': 0.080,
+}
+
+
+def benchmark(name):
+    """Registers the decorated setup function as benchmark *name*.
+
+    The setup function is called with a size, and returns a callable that is
+    timed, or a tuple of that callable and another one called once the case
+    is done, such as to cancel timers. It may raise NotImplementedError to
+    skip the case.
+
+    Players should be built on a scheduler of their own, as the cases here
+    do, so that no timer or sanitation drop runs in the background of a
+    timed run.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def _scheduler():
+    # private! Returns a scheduler of its own for the players of a case. It
+    # is never advanced, so neither their timers nor the sanitation drop run
+    # while the case is timed.
+    from detectivegame420.util.dgutil import DGVirtualScheduler
+
+    return DGVirtualScheduler()
+
+def _votes(size):
+    # private! Returns a vote dictionary of *size* players for PROFESSIONS,
+    # on a scheduler of their own
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.players.dgplayertable import DGPlayerTable
+    from detectivegame420.util.gamesettings import PROFESSIONS, RANDOM_VOTE
+
+    scheduler = _scheduler()
+    table = DGPlayerTable(scheduler.time)
+    vote = {}
+    for i in range(size):
+        index = _randint(-1, len(PROFESSIONS)-1)
+        vote[DGPlayer(str(i), scheduler=scheduler, table=table)] = \
+            RANDOM_VOTE if index < 0 else PROFESSIONS[index]
+    return vote
+
+def _remover(players):
+    # private! Returns a teardown removing *players*, which cancels every
+    # timer they have started
+    def teardown():
+        for player in players:
+            player.remove()
+    return teardown
+
+def _investigate():
+    # private! Returns an item for the item benchmarks
+    from detectivegame420.items.dgitemlist import Investigate
+
+    return Investigate()
+
+@benchmark('DGPlayer()')
+def _bench_player(size):
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.players.dgplayertable import DGPlayerTable
+
+    names = [str(i) for i in range(size)]
+    scheduler = _scheduler()
+    def run():
+        table = DGPlayerTable(scheduler.time)
+        return [DGPlayer(name, scheduler=scheduler, table=table)
+                for name in names]
+    return run
+
+@benchmark('allocate_jobs_to_players')
+def _bench_allocate(size):
+    from detectivegame420.util.dgutil import allocate_jobs_to_players
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    vote = _votes(size)
+    default_profession = Unemployed()
+    def run():
+        return allocate_jobs_to_players(PROFESSIONS, default_profession, vote)
+    return run
+
+@benchmark('DGVoteBox.allocate')
+def _bench_votebox_allocate(size):
+    from detectivegame420.util.dgutil import DGVoteBox
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    votebox = DGVoteBox(PROFESSIONS, Unemployed())
+    for player, vote in _votes(size).items():
+        votebox.vote(player, vote)
+    def run():
+        return votebox.allocate()
+    return run
+
+@benchmark('DGVoteBox.vote (allocated)')
+def _bench_votebox_revote(size):
+    from detectivegame420.util.dgutil import DGVoteBox
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    votebox = DGVoteBox(PROFESSIONS, Unemployed())
+    for player, vote in _votes(size).items():
+        votebox.vote(player, vote)
+    votebox.allocate()
+    players = list(votebox)
+    def run():
+        # every player changes its vote once, repairing the allocation
+        for player in players:
+            votebox.vote(player,
+                         PROFESSIONS[_randint(0, len(PROFESSIONS)-1)])
+    return run
+
+@benchmark('elect_key_with_modifier')
+def _bench_elect(size):
+    from detectivegame420.util.dgutil import elect_key_with_modifier
+    from detectivegame420.util.gamesettings import PROFESSIONS
+
+    vote = _votes(size)
+    def run():
+        return [elect_key_with_modifier(prof, vote) for prof in PROFESSIONS]
+    return run
+
+@benchmark('DGProfessionSet.choose_job')
+def _bench_choose_job(size):
+    from detectivegame420.util.gamesettings import PROFESSIONS
+
+    profset = PROFESSIONS[0]
+    def run():
+        return [profset.choose_job() for i in range(size)]
+    return run
+
+@benchmark('eligible_itemuse')
+def _bench_eligible_itemuse(size):
+    from detectivegame420.util.dgutil import eligible_itemuse, \
+        allocate_jobs_to_players
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    item = _investigate()
+    players = allocate_jobs_to_players(PROFESSIONS, Unemployed(),
+                                       _votes(size))
+    def run():
+        return [eligible_itemuse(player, item) for player in players]
+    return run
+
+@benchmark('DGItemIndex.eligible_players')
+def _bench_eligible_players(size):
+    from detectivegame420.items.dgitemindex import default_index
+    from detectivegame420.util.dgutil import allocate_jobs_to_players
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    item = _investigate()
+    index = default_index()
+    players = allocate_jobs_to_players(PROFESSIONS, Unemployed(),
+                                       _votes(size))
+    def run():
+        return index.eligible_players(players, item)
+    return run
+
+@benchmark('eligible_players(registry)')
+def _bench_eligible_players_registry(size):
+    from detectivegame420.items.dgitemindex import default_index
+    from detectivegame420.util.dgutil import allocate_jobs_to_players
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    item = _investigate()
+    index = default_index()
+    players = allocate_jobs_to_players(PROFESSIONS, Unemployed(),
+                                       _votes(size))
+    registry = players[0].table.registry
+    def run():
+        return index.eligible_players(registry, item)
+    return run
+
+@benchmark('get_killer')
+def _bench_get_killer(size):
+    from detectivegame420.util.dgutil import get_killer
+
+    players = list(_votes(size))
+    players[_randint(0, size-1)].setkiller()
+    def run():
+        return get_killer(players)
+    return run
+
+@benchmark('get_killer(registry)')
+def _bench_get_killer_registry(size):
+    from detectivegame420.util.dgutil import get_killer
+
+    players = list(_votes(size))
+    players[_randint(0, size-1)].setkiller()
+    registry = players[0].table.registry
+    def run():
+        return get_killer(registry)
+    return run
+
+@benchmark('DGItem.info')
+def _bench_item_info(size):
+    item = _investigate()
+    def run():
+        return [item.info for i in range(size)]
+    return run
+
+@benchmark('DGPlayer.soak')
+def _bench_soak(size):
+    players = list(_votes(size))
+    def run():
+        for player in players:
+            player.soak()
+    return run, _remover(players)
+
+@benchmark('DGPlayer.setinvisible')
+def _bench_setinvisible(size):
+    players = list(_votes(size))
+    def run():
+        for player in players:
+            player.setinvisible(5)
+    return run, _remover(players)
+
+def run_benchmarks(names=None, sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT,
+                   seed=420, out=None):
+    """Runs the benchmarks *names*, or every registered one if None.
+
+    Every benchmark is run for each size in *sizes*, *repeat* times. The
+    random generator is seeded with *seed* before each setup, so that every
+    run works on the same data. Progress is written to *out* if given.
+
+    Returns a dictionary of
+    {<name>: {<size>: {'best': <s>, 'median': <s>, 'peak': <bytes>}}, ...}
+    with skipped cases left out.
+    """
+    if names is None:
+        names = list(BENCHMARKS)
+    results = {}
+    for name in names:
+        results[name] = {}
+        for size in sizes:
+            _seed(seed)
+            try:
+                run = BENCHMARKS[name](size)
+            except NotImplementedError as e:
+                if out:
+                    print('{:<28} {:>7} skipped: {}'.format(name, size, e),
+                          file=out)
+                break
+            teardown = None
+            if isinstance(run, tuple):
+                run, teardown = run
+
+            try:
+                timings = []
+                for i in range(repeat):
+                    start = _timer()
+                    run()
+                    timings.append(_timer() - start)
+                _tracemalloc.start()
+                try:
+                    run()
+                    peak = _tracemalloc.get_traced_memory()[1]
+                finally:
+                    _tracemalloc.stop()
+            finally:
+                if teardown is not None:
+                    teardown()
+
+            results[name][str(size)] = {
+                'best': min(timings), 'median': _median(timings), 'peak': peak,
+            }
+            if out:
+                print('{:<28} {:>7} {:>12.6f}s {:>12.6f}s {:>10}B'.format(
+                    name, size, min(timings), _median(timings), peak),
+                    file=out)
+    return results
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compares *results* against *baseline*, both as returned from
+    run_benchmarks().
+
+    Returns a list of (name, size, ratio) of cases whose best time is more
+    than *tolerance* slower than the baseline, ratio being new/old.
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            try:
+                old = baseline[name][size]['best']
+            except KeyError:
+                continue
+            ratio = result['best'] / old if old else float('inf')
+            if ratio > 1 + tolerance:
+                regressions.append((name, size, ratio))
+    return regressions
+
+def measure_import(module, repeat=DEFAULT_REPEAT):
+    """Returns the best time in seconds out of *repeat* fresh interpreters
+    to import *module*, as reported by -X importtime.
+    """
+    import detectivegame420
+    
+    # the directory containing the package
+    path = _os.path.dirname(_os.path.dirname(
+        _os.path.abspath(detectivegame420.__file__)))
+    env = dict(_os.environ)
+    env['PYTHONPATH'] = _os.pathsep.join(
+        p for p in (path, env.get('PYTHONPATH')) if p)
+    timings = []
+    for i in range(repeat):
+        proc = _subprocess.run(
+            [_sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            env=env, stderr=_subprocess.PIPE, universal_newlines=True,
+            check=True)
+        for line in proc.stderr.splitlines():
+            # import time: <self us> | <cumulative us> | <module>
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module:
+                timings.append(int(fields[1]) / 1e6)
+    return min(timings)
+
+def check_import_budgets(budgets=None, repeat=DEFAULT_REPEAT, out=None):
+    """Measures every module in *budgets*, a dictionary of
+    {<module>: <seconds>, ...} defaulting to IMPORT_BUDGETS.
+    
+    Returns a list of (module, seconds, budget) of modules over budget.
+    """
+    if budgets is None:
+        budgets = IMPORT_BUDGETS
+    over = []
+    for module, budget in budgets.items():
+        seconds = measure_import(module, repeat)
+        if out:
+            print('{:<40} {:>10.6f}s {:>10.6f}s'.format(module, seconds,
+                                                        budget), file=out)
+        if seconds > budget:
+            over.append((module, seconds, budget))
+    return over
+
+def main(argv=None):
+    parser = _ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help='benchmarks to run, defaults to every one')
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--save', metavar='FILE',
+                        help='save results as a JSON baseline')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--imports', action='store_true',
+                        help='check import times against IMPORT_BUDGETS')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        print('{:<40} {:>11} {:>11}'.format('module', 'import', 'budget'))
+        over = check_import_budgets(repeat=args.repeat, out=_sys.stdout)
+        for module, seconds, budget in over:
+            print('OVER BUDGET {}: {:.6f}s > {:.6f}s'.format(module, seconds,
+                                                             budget))
+        return 1 if over else 0
+
+    print('{:<28} {:>7} {:>13} {:>13} {:>11}'.format(
+        'benchmark', 'size', 'best', 'median', 'peak'))
+    results = run_benchmarks(args.names or None, args.sizes, args.repeat,
+                             out=_sys.stdout)
+    if args.save:
+        with open(args.save, 'w') as f:
+            _json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = _json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, size, ratio in regressions:
+            print('REGRESSION {} [{}]: {:.2f}x slower'.format(name, size,
+                                                              ratio))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the event bus in the planned plugin DetectiveGame420"""
+
+__all__ = [
+    'DGEvent', 'DGMessageEvent', 'DGScoreEvent', 'DGDeathEvent',
+    'DGDriedEvent', 'DGInvisibilityEndEvent', 'DGEventBus', 'DGConsoleSink',
+    'DGFileSink', 'DGMemorySink', 'default_bus',
+]
+
+# Python default modules
+import sys as _sys
+from collections import deque as _deque
+from threading import Thread as _Thread, Event as _Event, Lock as _Lock
+from time import time as _time, sleep as _sleep
+
+# Modules in current package
+from detectivegame420.util import dgstats as _dgstats
+
+# Constants
+from detectivegame420.util.gamesettings import EVENTBUS_INTERVAL, \
+    SCOREREASON_OTHER
+
+
+class DGEvent(object):
+    """Base class of every event sent through DGEventBus.
+
+    *time* is the time the event was created at, as returned by time.time().
+    """
+    def __init__(self):
+        self.time = _time()
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.message)
+
+    @property
+    def message(self):
+        """Returns the message shown to players, or an empty string."""
+        return ''
+
+
+class DGMessageEvent(DGEvent):
+    """A plain message, such as the end message of a DGDelayedScheduler or
+    the output of main().
+    """
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    @property
+    def message(self):
+        return self.text
+
+
+class DGScoreEvent(DGEvent):
+    """Score of the player *name* has changed by *score* for *reason*, one of
+    SCOREREASON_* constants, with an optional *msg*.
+    """
+    def __init__(self, name, score, msg='', reason=SCOREREASON_OTHER):
+        super().__init__()
+        self.name = name
+        self.score = score
+        self.msg = msg
+        self.reason = reason
+
+    @property
+    def message(self):
+        message = '(To {0}) {1:+}pts'.format(self.name, self.score)
+        if self.msg:
+            message = message + ': ' + self.msg
+        return message
+
+
+class DGDeathEvent(DGEvent):
+    """The player *name* has been killed."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    @property
+    def message(self):
+        return '{}\'s been killed.'.format(self.name)
+
+
+class DGDriedEvent(DGEvent):
+    """The player *name* is no longer soaked."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    @property
+    def message(self):
+        return '{0} is now fully dried'.format(self.name)
+
+
+class DGInvisibilityEndEvent(DGEvent):
+    """The player *name* is no longer invisible."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    @property
+    def message(self):
+        return '{0} is visible again'.format(self.name)
+
+
+class DGEventBus(object):
+    """Passes events on to sinks without blocking the emitting thread.
+
+    emit() only appends to a deque, which needs no lock. Events are handed
+    to the sinks in batches by a worker thread, started on the first event,
+    after waiting *interval* seconds for more events to come in. flush()
+    hands over pending events right away on the calling thread.
+
+    A sink is a callable taking a list of events, such as DGConsoleSink,
+    DGFileSink and DGMemorySink.
+    """
+    def __init__(self, sinks=(), interval=EVENTBUS_INTERVAL, maxlen=None):
+        """*sinks* is an iterable of sinks to subscribe.
+
+        *interval* is the time in seconds to wait for a batch to fill up.
+        None starts no worker thread, keeping events until flush() is
+        called.
+
+        *maxlen* bounds the number of pending events, dropping the oldest
+        ones once exceeded. Defaults to None, keeping every event.
+        """
+        self._sinks = tuple(sinks)
+        self._interval = interval
+        self._queue = _deque(maxlen=maxlen)
+        self._wakeup = _Event()
+        self._drainlock = _Lock()
+        self._thread = None
+        self._threadlock = _Lock()
+
+    def __len__(self):
+        """Returns the number of pending events."""
+        return len(self._queue)
+
+    @property
+    def sinks(self):
+        return self._sinks
+
+    def subscribe(self, sink):
+        """Adds *sink* to this bus."""
+        self._sinks = self._sinks + (sink,)
+
+    def unsubscribe(self, sink):
+        """Removes *sink* from this bus."""
+        self._sinks = tuple(s for s in self._sinks if s is not sink)
+
+    def emit(self, event):
+        """Queues *event*, a DGEvent instance, for the sinks."""
+        self._queue.append(event)
+        if self._thread is None:
+            if self._interval is None:
+                return
+            self._start()
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _start(self):
+        # private! Starts the worker thread once.
+        with self._threadlock:
+            if self._thread is None:
+                import atexit
+
+                # daemon threads are killed at exit, so hand over what is
+                # left before that
+                atexit.register(self.flush)
+                self._thread = _Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # private! A target method for threading.Thread
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            _sleep(self._interval)
+            self.flush()
+
+    def flush(self):
+        """Hands every pending event to the sinks on the calling thread.
+
+        Returns the number of events handed over.
+        """
+        with self._drainlock:
+            events = []
+            popleft = self._queue.popleft
+            try:
+                while True:
+                    events.append(popleft())
+            except IndexError:
+                pass
+            if events:
+                if _dgstats.enabled:
+                    _dgstats.observe('eventbus.batch', len(events))
+                for sink in self._sinks:
+                    try:
+                        sink(events)
+                    except Exception:
+                        from traceback import print_exc
+                        print_exc()
+        return len(events)
+
+
+class DGConsoleSink(object):
+    """Writes the message of every event to *stream*, defaulting to
+    sys.stdout at the time of writing. Events without a message are skipped.
+    """
+    def __init__(self, stream=None):
+        self._stream = stream
+
+    def __call__(self, events):
+        text = ''.join(e.message + '\n' for e in events if e.message)
+        if text:
+            stream = _sys.stdout if self._stream is None else self._stream
+            stream.write(text)
+            stream.flush()
+
+
+class DGFileSink(object):
+    """Appends every event to the file *path*, a line each of the time, the
+    event type and the message separated by tabs.
+    """
+    def __init__(self, path, mode='a'):
+        self._file = open(path, mode)
+
+    def __call__(self, events):
+        self._file.write(''.join(
+            '{0:.6f}\t{1}\t{2}\n'.format(e.time, e.__class__.__name__,
+                                         e.message) for e in events))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class DGMemorySink(object):
+    """Keeps events in *events*, a deque holding the last *maxlen* events,
+    or every event if *maxlen* is None.
+    """
+    def __init__(self, maxlen=None):
+        self.events = _deque(maxlen=maxlen)
+
+    def __call__(self, events):
+        self.events.extend(events)
+
+    def of_type(self, cls):
+        """Returns a list of kept events which are instances of *cls*."""
+        return [e for e in self.events if isinstance(e, cls)]
+
+    def clear(self):
+        self.events.clear()
+
+
+# Bus used by every DGPlayer and DGDelayedScheduler created without a bus
+default_bus = DGEventBus([DGConsoleSink()])
+
+# Self-test code
+def _test():
+    memory = DGMemorySink()
+    bus = DGEventBus([DGConsoleSink(), memory])
+    bus.emit(DGScoreEvent('OhGree', 5, 'found a clue'))
+    bus.emit(DGDriedEvent('OhGree'))
+    bus.emit(DGDeathEvent('OhGree'))
+    _sleep(EVENTBUS_INTERVAL * 4)
+    print(memory.of_type(DGDeathEvent))
+
+if __name__ == '__main__':
+    _test()
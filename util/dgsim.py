@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of the role allocation simulator in the planned plugin
+DetectiveGame420"""
+
+__all__ = ['DGSimulationResult', 'simulate']
+
+# Python default modules
+import random as _random
+from collections import Counter as _Counter
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from os import cpu_count as _cpu_count
+
+# Modules in current package
+from detectivegame420.util.dgutil import allocate_jobs_to_lobbies
+from detectivegame420.professions.dgprofession import DGProfessionSet
+
+# Constants
+from detectivegame420.util.gamesettings import RANDOM_VOTE
+
+
+class DGSimulationResult(object):
+    """Aggregated statistics of simulated games.
+
+    Results of separate runs can be added together with merge().
+    """
+    def __init__(self, names=()):
+        """*names* is a tuple of the names of the simulated professions, in
+        the order of the professions.
+        """
+        self._names = tuple(names)
+        self.games = 0
+        self.players = 0
+        self.random_votes = 0
+        # profession index -> count
+        self.votes = _Counter()
+        self.matches = _Counter()
+        self.filled = _Counter()
+        # job name -> count
+        self.killer_jobs = _Counter()
+
+    def __repr__(self):
+        return '{0}(games={1})'.format(self.__class__.__name__, self.games)
+
+    def merge(self, other):
+        """Adds the statistics of *other* to this result."""
+        if not self._names:
+            self._names = other._names
+        self.games += other.games
+        self.players += other.players
+        self.random_votes += other.random_votes
+        self.votes.update(other.votes)
+        self.matches.update(other.matches)
+        self.filled.update(other.filled)
+        self.killer_jobs.update(other.killer_jobs)
+        return self
+
+    @property
+    def match_rates(self):
+        """Returns a dictionary of {<profession name>: <rate>, ...}, the rate
+        being the share of voters of the profession who got a job from it.
+        """
+        return {name: self.matches[i] / self.votes[i]
+                for i, name in enumerate(self._names) if self.votes[i]}
+
+    @property
+    def fill_rates(self):
+        """Returns a dictionary of {<profession name>: <rate>, ...}, the rate
+        being the share of games in which the profession was given to a
+        player.
+        """
+        if not self.games:
+            return {}
+        return {name: self.filled[i] / self.games
+                for i, name in enumerate(self._names)}
+
+    @property
+    def killer_job_rates(self):
+        """Returns a dictionary of {<job name>: <rate>, ...}, the rate being
+        the share of games in which the killer had the job.
+        """
+        if not self.games:
+            return {}
+        return {name: count / self.games
+                for name, count in self.killer_jobs.most_common()}
+
+    @property
+    def info(self):
+        """Returns a string containing a report of this result."""
+        info_ = '{0} games, {1} players, {2} random votes\n'.format(
+            self.games, self.players, self.random_votes)
+        info_ += '{:>19} {:>8} {:>8}\n'.format('', 'match', 'fill')
+        match_rates = self.match_rates
+        for name, fill_rate in self.fill_rates.items():
+            match_rate = match_rates.get(name)
+            info_ += '{:>19} {:>8} {:>8.2%}\n'.format(
+                name, '-' if match_rate is None else
+                '{:.2%}'.format(match_rate), fill_rate)
+        info_ += 'Killer jobs:\n'
+        for name, rate in self.killer_job_rates.items():
+            info_ += '{:>19} {:>8.2%}\n'.format(name, rate)
+        return info_
+
+
+def simulate(games, players=8, vote_weights=None, multiplier=10, seed=None,
+             professions=None, default_profession=None, workers=None,
+             chunksize=10000):
+    """Runs *games* headless job allocations and returns a
+    DGSimulationResult.
+
+    *players* is the number of players in each game, or a tuple of (lowest,
+    highest) number to choose from for each game.
+
+    *vote_weights* is a sequence of weights for voting each profession,
+    followed by the weight of a random vote. Defaults to None, weighing
+    every vote equally.
+
+    *multiplier* is passed on to allocate_jobs_to_lobbies().
+
+    *seed* makes the run repeatable. Each chunk of *chunksize* games is run
+    with its own random stream derived from *seed* and the chunk number, so
+    the result does not depend on *workers*.
+
+    *professions* and *default_profession* default to PROFESSIONS and
+    Unemployed().
+
+    *workers* is the number of worker processes. Defaults to the number of
+    CPUs. 0 runs every chunk in the current process.
+    """
+    if professions is None or default_profession is None:
+        from detectivegame420.util.gamesettings import PROFESSIONS
+        from detectivegame420.professions.dgprofessionlist import Unemployed
+        if professions is None:
+            professions = PROFESSIONS
+        if default_profession is None:
+            default_profession = Unemployed()
+    if isinstance(players, int):
+        players = (players, players)
+    if vote_weights is None:
+        vote_weights = (1,) * (len(professions)+1)
+    assert len(vote_weights) == len(professions)+1, \
+        '*vote_weights* should have a weight for every profession and random'
+    if seed is None:
+        seed = _random.getrandbits(64)
+    if workers is None:
+        workers = _cpu_count() or 1
+
+    tasks = []
+    for chunk, start in enumerate(range(0, games, chunksize)):
+        tasks.append((min(chunksize, games-start), players,
+                      tuple(vote_weights), multiplier,
+                      '{0}:{1}'.format(seed, chunk),
+                      tuple(professions), default_profession))
+
+    result = DGSimulationResult([prof.name for prof in professions])
+    if workers == 0:
+        for task in tasks:
+            result.merge(_simulate_chunk(task))
+    else:
+        with _ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_result in executor.map(_simulate_chunk, tasks):
+                result.merge(chunk_result)
+    return result
+
+def _simulate_chunk(task):
+    # private! Runs a chunk of simulate() in a worker process.
+    (games, players, vote_weights, multiplier, seed, professions,
+     default_profession) = task
+    # the allocation functions draw from the module-level generator, which
+    # is private to this process
+    _random.seed(seed)
+
+    population = list(range(len(professions))) + [RANDOM_VOTE]
+    lobbies = []
+    for i in range(games):
+        size = _random.randint(*players)
+        lobbies.append(_random.choices(population, vote_weights, k=size))
+    jobs, assignments = allocate_jobs_to_lobbies(professions,
+                                                 default_profession, lobbies,
+                                                 multiplier)
+
+    # job index -> index of the profession the job was given from
+    owner = []
+    for job in jobs:
+        for i, prof in enumerate(professions):
+            if job is prof or (isinstance(prof, DGProfessionSet)
+                               and job in prof.jobs()):
+                owner.append(i)
+                break
+        else:
+            owner.append(RANDOM_VOTE)
+
+    result = DGSimulationResult([prof.name for prof in professions])
+    killer_jobs = _Counter()
+    for lobby, assignment in zip(lobbies, assignments):
+        result.games += 1
+        result.players += len(lobby)
+        for vote, job in zip(lobby, assignment):
+            if vote == RANDOM_VOTE:
+                result.random_votes += 1
+                continue
+            result.votes[vote] += 1
+            if owner[job] == vote:
+                result.matches[vote] += 1
+        result.filled.update(set(owner[job] for job in assignment))
+        if assignment:
+            killer_jobs[assignment[_random.randint(0, len(assignment)-1)]] += 1
+    del result.filled[RANDOM_VOTE]
+    for job, count in killer_jobs.items():
+        result.killer_jobs[jobs[job].name] += count
+    return result
+
+# Self-test code
+def _test():
+    result = simulate(100000, players=(6, 12), seed=420)
+    print(result.info)
+
+if __name__ == '__main__':
+    _test()
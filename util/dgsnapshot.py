@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of game snapshots in the planned plugin DetectiveGame420
+
+A snapshot holds the players of a game: their names, every column of their
+rows in DGPlayerTable, their entries in the score ledger and their pending
+drying and invisibility timers. Jobs are saved along with the professions
+they refer to, so profession IDs of the saving and the loading process need
+not match.
+
+The format is a fixed header followed by raw array.array buffers:
+
+    header      magic, version, byte order and section sizes
+    professions pickled list of (ID, DGProfession)
+    names       name length per row, then every name in UTF-8
+    columns     every column of DGPlayerTable.COLUMNS in order
+    timers      drying time, invisible ticks and next invisible tick per row
+    ledger      player, delta, reason and time columns of the score ledger
+
+Arrays are written in the byte order of the saving machine, and swapped on
+load if needed. Professions are pickled, so only load trusted snapshots.
+"""
+
+__all__ = ['dumps', 'dump', 'loads', 'load', 'MMAP_THRESHOLD']
+
+# Python default modules
+import mmap as _mmap
+import os as _os
+import pickle as _pickle
+import struct as _struct
+import sys as _sys
+from array import array as _array
+
+# Modules in current package
+from detectivegame420.players.dgplayer import DGPlayer
+from detectivegame420.players.dgplayertable import DGPlayerTable
+from detectivegame420.players.dgscoreledger import DGScoreLedger
+from detectivegame420.professions.dgprofession import registry
+
+_MAGIC = b'DG420SNP'
+_VERSION = 1
+# magic, version, byte order, rows, ledger entries, professions size, names
+# size
+_HEADER = _struct.Struct('<8sBB2xIIII')
+_BYTEORDERS = ('little', 'big')
+# column name, typecode of timers and ledger sections
+_TIMERS = (('drying', 'd'), ('invisible', 'I'), ('invisible_next', 'd'))
+_LEDGER = (('player', 'I'), ('delta', 'i'), ('reason', 'B'), ('time', 'd'))
+# missing timers are saved as NaN
+_NAN = float('nan')
+
+# files of at least this many bytes are loaded through mmap
+MMAP_THRESHOLD = 1 << 20
+
+
+def dumps(players):
+    """Returns a snapshot of *players*, a sequence of DGPlayer instances in
+    the same DGPlayerTable, as bytes.
+    """
+    players = list(players)
+    if not players:
+        table = DGPlayerTable()
+    else:
+        table = players[0].table
+        assert all(p.table is table for p in players), \
+            'every player must be in the same table'
+    rows = [p.row for p in players]
+
+    jobs = sorted(set(table.job[r] for r in rows) - {-1})
+    professions = _pickle.dumps([(job, registry[job]) for job in jobs],
+                                _pickle.HIGHEST_PROTOCOL)
+    names = [p.name.encode('utf-8') for p in players]
+    namelengths = _array('I', [len(name) for name in names])
+    names = b''.join(names)
+
+    arrays = []
+    for column, typecode in DGPlayerTable.COLUMNS:
+        values = getattr(table, column)
+        arrays.append(_array(typecode, [values[r] for r in rows]))
+
+    timers = [_array(typecode) for column, typecode in _TIMERS]
+    for p in players:
+        drying, invisible, invisible_next = p.pendingtimers()
+        timers[0].append(_NAN if drying is None else drying)
+        timers[1].append(invisible)
+        timers[2].append(_NAN if invisible_next is None else invisible_next)
+    arrays.extend(timers)
+
+    ids = set(table.id[r] for r in rows)
+    ledger = table.ledger
+    entries = [i for i, p in enumerate(ledger.player) if p in ids]
+    for column, typecode in _LEDGER:
+        values = getattr(ledger, column)
+        arrays.append(_array(typecode, [values[i] for i in entries]))
+
+    header = _HEADER.pack(_MAGIC, _VERSION,
+                          _BYTEORDERS.index(_sys.byteorder), len(players),
+                          len(entries), len(professions), len(names))
+    return b''.join([header, professions, bytes(namelengths), names] +
+                    [bytes(a) for a in arrays])
+
+def dump(players, file):
+    """Writes a snapshot of *players* to *file*, a path or a binary file
+    object. Refer to dumps().
+    """
+    data = dumps(players)
+    if hasattr(file, 'write'):
+        file.write(data)
+    else:
+        with open(file, 'wb') as f:
+            f.write(data)
+
+def loads(data, scheduler=None, bus=None):
+    """Restores players from *data*, a bytes-like object holding a
+    snapshot.
+
+    Players are restored in a new DGPlayerTable, in the order they were
+    saved, and their timers resume with the time they had left. *scheduler*
+    and *bus* are passed on to DGPlayer.from_row(), and the time() method of
+    *scheduler* becomes the clock of the score ledger, so that restored and
+    later entries are on the same clock.
+
+    Returns a list of DGPlayer instances.
+
+    Raises ValueError if *data* is not a snapshot.
+    """
+    with memoryview(data) as view, view.cast('B') as view:
+        return _loads(view, scheduler, bus)
+
+def load(file, scheduler=None, bus=None):
+    """Restores players from *file*, a path to a snapshot. Files of at least
+    MMAP_THRESHOLD bytes are mapped into memory instead of being read.
+    Refer to loads().
+    """
+    with open(file, 'rb') as f:
+        size = _os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            return loads(f.read(), scheduler, bus)
+        with _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ) as mm:
+            return loads(mm, scheduler, bus)
+
+def _loads(view, scheduler, bus):
+    # private! Restores players from *view*, a memoryview of bytes.
+    if len(view) < _HEADER.size:
+        raise ValueError('not a snapshot')
+    (magic, version, byteorder, nrows, nentries, profsize,
+     namesize) = _HEADER.unpack_from(view)
+    if magic != _MAGIC:
+        raise ValueError('not a snapshot')
+    if version != _VERSION:
+        raise ValueError('unsupported snapshot version {}'.format(version))
+    swap = _BYTEORDERS[byteorder] != _sys.byteorder
+    offset = _HEADER.size
+
+    def take(typecode, count):
+        nonlocal offset
+        values = _array(typecode)
+        end = offset + count * values.itemsize
+        if end > len(view):
+            raise ValueError('truncated snapshot')
+        values.frombytes(view[offset:end])
+        if swap:
+            values.byteswap()
+        offset = end
+        return values
+
+    professions = _pickle.loads(view[offset:offset+profsize])
+    offset += profsize
+    namelengths = take('I', nrows)
+    names = []
+    start = offset
+    for length in namelengths:
+        names.append(str(view[start:start+length], 'utf-8'))
+        start += length
+    offset += namesize
+
+    columns = {column: take(typecode, nrows)
+               for column, typecode in DGPlayerTable.COLUMNS}
+    timers = [take(typecode, nrows) for column, typecode in _TIMERS]
+    ledger = [take(typecode, nentries) for column, typecode in _LEDGER]
+
+    # saved profession IDs -> IDs in this process
+    jobmap = {job: prof.id for job, prof in professions}
+    jobs = columns['job']
+    for r in range(nrows):
+        if jobs[r] >= 0:
+            jobs[r] = jobmap[jobs[r]]
+
+    if scheduler is None:
+        clock = None
+        ledger = DGScoreLedger.from_entries(*ledger)
+    else:
+        clock = scheduler.time
+        ledger = DGScoreLedger.from_entries(*ledger, clock=clock)
+    table = DGPlayerTable.from_columns(columns, ledger, clock)
+    players = []
+    for row, name in enumerate(names):
+        player = DGPlayer.from_row(name, table, row, scheduler, bus)
+        drying, invisible, invisible_next = (t[row] for t in timers)
+        # NaN is the only value not equal to itself
+        player.resumetimers(None if drying != drying else drying, invisible,
+                            None if invisible_next != invisible_next
+                            else invisible_next)
+        players.append(player)
+    return players
+
+# Self-test code
+def _test():
+    from detectivegame420.professions.dgprofessionlist import Doctor, Police
+
+    players = [DGPlayer('OhGree', Doctor()), DGPlayer('Minjun Shin', Police())]
+    players[0].setkiller()
+    players[1].soak()
+    players[1].setinvisible(5)
+    players[1].addscore(3, 'found a clue')
+    data = dumps(players)
+    print(len(data), 'bytes')
+    for p in loads(data):
+        print(p, p.iskiller, p.soaked, p.invisible, p.score,
+              p.pendingtimers())
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Demonstration of runtime statistics in the planned plugin DetectiveGame420
+
+Counters, histograms and gauges recorded by the hot paths of the package:
+
+    allocation.*    allocate_jobs_to_players() and allocate_jobs_to_lobbies()
+    scheduler.*     DGScheduler ticks and timers
+    sanitation.*    DGSanitationEngine ticks
+    eventbus.*      DGEventBus batches
+
+Recording is disabled by default, and every recording function returns at
+once while disabled. Call enable(), or set the DETECTIVEGAME420_STATS
+environment variable, to start recording, and snapshot() to read what has
+been recorded. Every function can be called from any thread.
+"""
+
+__all__ = [
+    'enable', 'disable', 'is_enabled', 'count', 'observe', 'start', 'stop',
+    'timed', 'gauge', 'set_hook', 'snapshot', 'reset',
+]
+
+# Python default modules
+from math import frexp as _frexp
+from os import environ as _environ
+from threading import Lock as _Lock
+from time import perf_counter as _perf_counter
+
+# read by hot paths before doing anything else
+enabled = bool(_environ.get('DETECTIVEGAME420_STATS'))
+
+_lock = _Lock()
+# name -> count
+_counters = {}
+# name -> [count, sum, min, max, {bucket: count}]
+_histograms = {}
+# name -> function returning the current value
+_gauges = {}
+_hook = None
+
+
+def enable():
+    """Starts recording."""
+    global enabled
+    enabled = True
+
+def disable():
+    """Stops recording. Recorded values are kept until reset()."""
+    global enabled
+    enabled = False
+
+def is_enabled():
+    return enabled
+
+def set_hook(hook):
+    """Calls *hook* with (kind, name, value) for every value recorded from
+    now on, *kind* being 'count' or 'observe'. None removes the hook.
+
+    The hook runs on the recording thread, so it should return quickly.
+    """
+    global _hook
+    _hook = hook
+
+def count(name, n=1):
+    """Adds *n* to the counter *name*."""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+    if _hook is not None:
+        _hook('count', name, n)
+
+def observe(name, value):
+    """Records *value* in the histogram *name*.
+
+    Values are counted in buckets of powers of 2, so percentiles in
+    snapshot() are upper bounds within a factor of 2.
+    """
+    if not enabled:
+        return
+    # bucket e holds values in [2**(e-1), 2**e)
+    bucket = _frexp(value)[1] if value > 0 else None
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            _histograms[name] = [1, value, value, value, {bucket: 1}]
+        else:
+            histogram[0] += 1
+            histogram[1] += value
+            if value < histogram[2]:
+                histogram[2] = value
+            if value > histogram[3]:
+                histogram[3] = value
+            buckets = histogram[4]
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+    if _hook is not None:
+        _hook('observe', name, value)
+
+def start():
+    """Returns the current time for stop(), or None while disabled."""
+    if not enabled:
+        return None
+    return _perf_counter()
+
+def stop(name, started):
+    """Records the seconds elapsed since *started*, as returned by start(),
+    in the histogram *name*. Does nothing if *started* is None.
+    """
+    if started is not None:
+        observe(name, _perf_counter() - started)
+
+class timed(object):
+    """Context manager and decorator recording the seconds spent in a block
+    or a function in the histogram *name*.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._started = None
+
+    def __enter__(self):
+        self._started = start()
+        return self
+
+    def __exit__(self, *exc_info):
+        stop(self._name, self._started)
+
+    def __call__(self, func):
+        name = self._name
+        def wrapper(*args, **kwargs):
+            started = start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(name, started)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+def gauge(name, func):
+    """Registers *func*, a function returning the current value of *name*,
+    to be called by snapshot(). None removes the gauge.
+    """
+    with _lock:
+        if func is None:
+            _gauges.pop(name, None)
+        else:
+            _gauges[name] = func
+
+def _percentile(count, buckets, rank):
+    # private! Returns the upper bound of the bucket holding the value of
+    # *rank* (0 to 1) among *count* values.
+    target = rank * count
+    seen = 0
+    for bucket in sorted(buckets, key=lambda b: -1075 if b is None else b):
+        seen += buckets[bucket]
+        if seen >= target:
+            return 0.0 if bucket is None else 2.0 ** bucket
+    return 0.0
+
+def snapshot():
+    """Returns a dictionary of recorded values:
+
+    {'counters': {<name>: <count>, ...},
+     'histograms': {<name>: {'count': , 'sum': , 'min': , 'max': , 'mean': ,
+                             'p50': , 'p90': , 'p99': }, ...},
+     'gauges': {<name>: <value>, ...}}
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {name: (h[0], h[1], h[2], h[3], dict(h[4]))
+                      for name, h in _histograms.items()}
+        gauges = dict(_gauges)
+    return {
+        'counters': counters,
+        'histograms': {
+            name: {
+                'count': n, 'sum': total, 'min': low, 'max': high,
+                'mean': total / n,
+                'p50': _percentile(n, buckets, 0.5),
+                'p90': _percentile(n, buckets, 0.9),
+                'p99': _percentile(n, buckets, 0.99),
+            } for name, (n, total, low, high, buckets) in histograms.items()
+        },
+        'gauges': {name: func() for name, func in gauges.items()},
+    }
+
+def reset():
+    """Forgets every recorded counter and histogram. Gauges are kept."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+# Self-test code
+def _test():
+    from pprint import pprint
+    # the package module, not __main__ when run with -m
+    from detectivegame420.util import dgstats
+    from detectivegame420.util.dgutil import allocate_jobs_to_players
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+
+    dgstats.enable()
+    vote = {DGPlayer(str(i)): PROFESSIONS[i % len(PROFESSIONS)]
+            for i in range(5)}
+    for i in range(100):
+        allocate_jobs_to_players(PROFESSIONS, Unemployed(), vote)
+    pprint(dgstats.snapshot())
+
+if __name__ == '__main__':
+    _test()
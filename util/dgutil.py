@@ -4,39 +4,360 @@
 """Demonstration of DGUtil class in the planned plugin DetectiveGame420"""
 
 __all__ = [
-    'DGScheduler', 'DGDelayedScheduler', 'elect_key_with_modifier',
-    'allocate_jobs_to_players', 'get_killer', 'eligible_itemuse',
+    'DGScheduler', 'DGVirtualScheduler', 'DGDelayedScheduler', 'DGLagMonitor',
+    'default_scheduler', 'CATCHUP', 'COALESCE', 'SHED',
+    'elect_key_with_modifier', 'elect_keys_with_modifier',
+    'allocate_jobs_to_players', 'allocate_jobs_to_lobbies', 'DGVoteBox',
+    'get_killer', 'eligible_itemuse',
 ]
 
-from threading import Thread as _Thread
-from random import randint as _randint
-from time import sleep as _sleep
+from array import array as _array
+from heapq import heappush as _heappush, heappop as _heappop
+from threading import Thread as _Thread, Condition as _Condition, \
+    Lock as _Lock
+from random import randint as _randint, random as _random
+from time import monotonic as _monotonic, sleep as _sleep
+from math import ceil as _ceil
 
 from detectivegame420.professions.dgprofession import DGProfessionSet
+from detectivegame420.util.dgevent import DGMessageEvent, default_bus
+from detectivegame420.util import dgstats as _dgstats
 
+# Constants
+from detectivegame420.util.gamesettings import SCHEDULER_TICK, \
+    SCHEDULER_WHEEL_SIZE, SCHEDULER_SHED_LAG
 
-class DGScheduler(_Thread):
-    """Not implemented as of now. Raises NotImplementedError if called."""
-    def __init__(self, target):
-        raise NotImplementedError
-        super().__init__(target=target)
-        self.setDaemon(True)
+# Overload policies of schedulers, deciding what a late repeating timer does.
+# CATCHUP calls the target once for every missed interval, COALESCE calls it
+# once and counts the missed intervals as done, and SHED skips calls of low
+# priority timers while the scheduler is more than SCHEDULER_SHED_LAG seconds
+# late. Repeats are counted the same way in every policy, so a timer ends on
+# time no matter how late its calls are.
+CATCHUP = 'catchup'
+COALESCE = 'coalesce'
+SHED = 'shed'
+
+
+class DGLagMonitor(object):
+    """Measures how late a scheduler runs.
     
-    def run(self):
-        pass
+    *lag* is the time in seconds between when something was due and when it
+    ran. *jitter* is the variation of lag from one measurement to the next,
+    smoothed as in RFC 3550.
+    """
+    def __init__(self):
+        self.count = 0
+        self.last = 0.0
+        self.mean = 0.0
+        self.max = 0.0
+        self.jitter = 0.0
+        
+    def __repr__(self):
+        return '{0}(last={1:.6f}, mean={2:.6f}, max={3:.6f}, ' \
+               'jitter={4:.6f})'.format(self.__class__.__name__, self.last,
+                                        self.mean, self.max, self.jitter)
     
+    def record(self, lag):
+        """Adds a measurement of *lag* seconds."""
+        if self.count:
+            self.jitter += (abs(lag - self.last) - self.jitter) / 16
+        self.count += 1
+        self.mean += (lag - self.mean) / self.count
+        if lag > self.max:
+            self.max = lag
+        self.last = lag
+        
+    @property
+    def info(self):
+        """Returns a dictionary of every measurement."""
+        return {'count': self.count, 'last': self.last, 'mean': self.mean,
+                'max': self.max, 'jitter': self.jitter}
+
+
+class DGScheduler(object):
+    """Runs every scheduled timer on a single worker thread.
     
-class DGDelayedScheduler(_Thread):
-    """Schedules a repeated delayed task.
+    Timers are kept in a hashed timing wheel of SCHEDULER_WHEEL_SIZE slots,
+    each slot standing for SCHEDULER_TICK seconds. Adding and removing a timer
+    only touches a single slot, so both are O(1) regardless of the number of
+    timers. The worker thread is started on the first timer and sleeps while
+    there is nothing to run.
+    
+    Ticks are laid on absolute deadlines, so a late tick is caught up on
+    instead of pushing every following timer back. Repeating timers are
+    rescheduled from the time they were due on rather than the time they
+    ran, in fractions of a tick, so repeats do not drift either. How late
+    each tick runs is measured in *lag*.
+    """
+    def __init__(self, tick=SCHEDULER_TICK, wheel_size=SCHEDULER_WHEEL_SIZE,
+                 policy=CATCHUP):
+        """*tick* is the length of a single tick in seconds.
+        
+        *wheel_size* is the number of slots in the wheel.
+        
+        *policy* is the overload policy, one of CATCHUP, COALESCE and SHED.
+        """
+        self.policy = policy
+        self.lag = DGLagMonitor()
+        self._tick = tick
+        # each slot maps a timer to the tick it is due on
+        self._wheel = [{} for i in range(wheel_size)]
+        self._ticknum = 0
+        self._timers = 0
+        self._epoch = None
+        self._wakeup = _Condition()
+        self._thread = None
+        
+    def __len__(self):
+        return self._timers
+    
+    @property
+    def tick(self):
+        return self._tick
+    
+    def time(self):
+        """Returns the current time in seconds, as time.monotonic()."""
+        return _monotonic()
+    
+    def add(self, timer, delay):
+        """Schedules *timer* to fire after *delay* seconds.
+        
+        *timer* is an object with a _fire() method, normally a
+        DGDelayedScheduler. Rescheduling a timer that is already in the wheel
+        moves it.
+        """
+        with self._wakeup:
+            self._schedule(timer, self._ticknum + delay / self._tick)
+            
+    def repeat(self, timer, interval):
+        """Schedules *timer* to fire *interval* seconds after the time it was
+        last due on, or after now if it has never been scheduled.
+        """
+        with self._wakeup:
+            due = getattr(timer, '_due', None)
+            if due is None:
+                due = self._ticknum
+            self._schedule(timer, due + interval / self._tick)
+            
+    def late(self, timer):
+        """Returns the time in seconds *timer* is running behind the time
+        it was due on. Meant to be called while *timer* fires.
+        """
+        epoch = self._epoch
+        due = getattr(timer, '_due', None)
+        if epoch is None or due is None:
+            return 0.0
+        return max(0.0, _monotonic() - (epoch + due * self._tick))
+    
+    def _schedule(self, timer, due):
+        # private! must be called with self._wakeup held. *due* is the exact
+        # tick number *timer* is due on, fired on the first tick not before
+        # it.
+        self._discard(timer)
+        ticknum = max(self._ticknum + 1, _ceil(round(due, 9)))
+        slot = self._wheel[ticknum % len(self._wheel)]
+        slot[timer] = ticknum
+        timer._wheelslot = slot
+        timer._due = due
+        self._timers += 1
+        if self._thread is None:
+            self._thread = _Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._wakeup.notify()
     
-    Important note: The target object is called after the specified delay. For
-    other means of schduling, please refer to (WIP)DGScheduler.
+    def remove(self, timer):
+        """Removes *timer* from the wheel if it has been scheduled."""
+        with self._wakeup:
+            self._discard(timer)
     
-    This class inherits threading.Thread
+    def remaining(self, timer):
+        """Returns the time in seconds until *timer* fires, rounded up to a
+        tick, or None if it has not been scheduled.
+        """
+        with self._wakeup:
+            slot = getattr(timer, '_wheelslot', None)
+            if slot is None:
+                return None
+            return (slot[timer] - self._ticknum) * self._tick
+    
+    def _discard(self, timer):
+        # private! must be called with self._wakeup held.
+        slot = getattr(timer, '_wheelslot', None)
+        if slot is not None:
+            del slot[timer]
+            timer._wheelslot = None
+            self._timers -= 1
+    
+    def _run(self):
+        # private! A target method for threading.Thread
+        while True:
+            with self._wakeup:
+                while not self._timers:
+                    self._epoch = None
+                    self._wakeup.wait()
+                if self._epoch is None:
+                    self._epoch = _monotonic() - self._ticknum * self._tick
+                deadline = self._epoch + (self._ticknum + 1) * self._tick
+            _sleep(max(0.0, deadline - _monotonic()))
+            lag = max(0.0, _monotonic() - deadline)
+            self.lag.record(lag)
+            if _dgstats.enabled:
+                _dgstats.observe('scheduler.tick_lag', lag)
+            self._runtick()
+            
+    def _runtick(self):
+        # private! Fires every timer due on the next tick.
+        with self._wakeup:
+            self._ticknum += 1
+            slot = self._wheel[self._ticknum % len(self._wheel)]
+            fired = [t for t, due in slot.items() if due <= self._ticknum]
+            for timer in fired:
+                self._discard(timer)
+        if _dgstats.enabled:
+            _dgstats.count('scheduler.fired', len(fired))
+        for timer in fired:
+            try:
+                timer._fire()
+            except Exception:
+                from traceback import print_exc
+                print_exc()
+    
+    
+class DGVirtualScheduler(object):
+    """Runs timers on a virtual clock.
+    
+    This is a drop-in replacement of DGScheduler for simulations and tests.
+    Nothing runs by itself: advance() moves the clock forward, jumping
+    straight from one due timer to the next and firing them in order on the
+    calling thread. A game of several minutes therefore takes only as long
+    as its timers take to run.
+    
+    Pass the time() method as the clock of DGPlayerTable so that the score
+    ledger follows the virtual clock as well.
+    
+    Timers never run late on a virtual clock, so *policy* and *lag* are only
+    there to match DGScheduler.
+    """
+    def __init__(self, start=0.0):
+        """*start* is the initial time in seconds. Defaults to 0.0"""
+        self.policy = CATCHUP
+        self.lag = DGLagMonitor()
+        self._now = start
+        # heap of (due, sequence, timer), sequence keeping timers due at the
+        # same time in the order they were added
+        self._heap = []
+        # timer -> (due, sequence) of its entry in the heap. Entries of
+        # removed or moved timers are left in the heap and skipped.
+        self._due = {}
+        self._sequence = 0
+        self._lock = _Lock()
+        
+    def __len__(self):
+        return len(self._due)
+    
+    def time(self):
+        """Returns the current virtual time in seconds."""
+        return self._now
+    
+    def add(self, timer, delay):
+        """Schedules *timer* to fire after *delay* seconds of virtual time.
+        Rescheduling a timer that is already scheduled moves it.
+        """
+        with self._lock:
+            self._schedule(timer, self._now + max(0.0, delay))
+            
+    def repeat(self, timer, interval):
+        """Schedules *timer* to fire *interval* seconds after the time it was
+        last due on, or after now if it has never been scheduled.
+        """
+        with self._lock:
+            due = getattr(timer, '_due', None)
+            if due is None:
+                due = self._now
+            self._schedule(timer, max(self._now, due + interval))
+            
+    def late(self, timer):
+        """Returns 0.0, since timers fire exactly on time."""
+        return 0.0
+    
+    def _schedule(self, timer, due):
+        # private! must be called with self._lock held.
+        self._sequence += 1
+        entry = (due, self._sequence)
+        self._due[timer] = entry
+        timer._due = due
+        _heappush(self._heap, entry + (timer,))
+            
+    def remove(self, timer):
+        """Removes *timer* if it has been scheduled."""
+        with self._lock:
+            self._due.pop(timer, None)
+            
+    def remaining(self, timer):
+        """Returns the virtual time in seconds until *timer* fires, or None
+        if it has not been scheduled.
+        """
+        entry = self._due.get(timer)
+        if entry is None:
+            return None
+        return entry[0] - self._now
+    
+    def next_due(self):
+        """Returns the time the next timer is due on, or None if there is
+        no timer.
+        """
+        with self._lock:
+            self._skipstale()
+            return self._heap[0][0] if self._heap else None
+        
+    def _skipstale(self):
+        # private! must be called with self._lock held.
+        heap = self._heap
+        while heap and self._due.get(heap[0][2]) != heap[0][:2]:
+            _heappop(heap)
+            
+    def run_until(self, deadline):
+        """Fires every timer due up to *deadline* in order, including
+        timers scheduled while running, and sets the clock to *deadline*.
+        
+        Returns the number of timers fired.
+        """
+        fired = 0
+        while True:
+            with self._lock:
+                self._skipstale()
+                if not self._heap or self._heap[0][0] > deadline:
+                    break
+                due, sequence, timer = _heappop(self._heap)
+                del self._due[timer]
+                self._now = max(self._now, due)
+            try:
+                timer._fire()
+            except Exception:
+                from traceback import print_exc
+                print_exc()
+            fired += 1
+        self._now = max(self._now, deadline)
+        return fired
+    
+    def advance(self, seconds):
+        """Moves the clock *seconds* forward, firing every timer due on the
+        way. Returns the number of timers fired.
+        """
+        return self.run_until(self._now + seconds)
+    
+    
+class DGDelayedScheduler(object):
+    """Schedules a repeated delayed task.
+    
+    Important note: The target object is called after the specified delay. This
+    class is a handle on a timer in DGScheduler, so no thread is created for
+    it.
     """
     __initialized = False
     def __init__(self, target, interval=0, repeat=1, args=(), kwargs=None,
-                 endmessage=None, endtarget=None, eargs=(), ekwargs=None):
+                 endmessage=None, endtarget=None, eargs=(), ekwargs=None,
+                 scheduler=None, bus=None, priority=0):
         """This constructor should be called with keyword arguments.
         Arguments are:
         
@@ -46,63 +367,113 @@ class DGDelayedScheduler(_Thread):
         each *target* calls. Defaults to 0.
         
         *repeat* is the number of times that the *target* object needs to be
-        called. Defaults to 1.
+        called. Defaults to 1. None repeats until cancelled.
+        
+        *endmessage* is the message emitted on *bus* when the timer is
+        finished. It defaults to None.
+        
+        *args*, *kwargs* is arguments passed on to *target*, and *eargs*,
+        *ekwargs* is arguments passed on to *endtarget*.
         
-        *endmessage* is the message printed when the thread is terminated. It
-        defaults to None.
+        *scheduler* is the DGScheduler running this timer, or any drop-in
+        replacement such as DGVirtualScheduler. Defaults to
+        default_scheduler.
         
-        *args*, *kwargs* is arguments passed on to threading.Thread. Refer to
-        threading.Thread pydoc for more information.
+        *bus* is the DGEventBus receiving *endmessage*. Defaults to
+        DGEvent.default_bus.
+        
+        *priority* is an integer. Calls of timers below 0 may be skipped by
+        a SHED scheduler running late. Defaults to 0.
         """
-        super().__init__()
         if kwargs is None:
             kwargs = {}
         if ekwargs is None:
             ekwargs = {}
         if endmessage is None:
             endmessage = ''
+        if scheduler is None:
+            scheduler = default_scheduler
+        if bus is None:
+            bus = default_bus
         self._target = target
         self._interval = interval
         self._repeat = repeat
+        self._remainingrepeats = repeat
         self._args = args
         self._kwargs = kwargs
         self._endmessage = endmessage
         self._endtarget = endtarget
         self._eargs = eargs
         self._ekwargs = ekwargs
-        self.setDaemon(True)
+        self._scheduler = scheduler
+        self._bus = bus
+        self._priority = priority
+        self._wheelslot = None
+        self._due = None
         self.__finished = False
         self.__initialized = True
         
-    def run(self):
-        self._remainingrepeats = self._repeat
-        while True:
-            if self._remainingrepeats is 0:
-                if self._endmessage:
-                    print(self._endmessage)
-                if self._endtarget:
-                    self._endtarget(*self._eargs, **self._ekwargs)
-                break
-            
-            _sleep(self._interval)
-            
-            if self.__finished:
-                break
+    def start(self, delay=None):
+        """Schedules the first call of *target* after *delay* seconds,
+        defaulting to *interval*.
+        """
+        assert self.__initialized, 'DGScheduler.__init__() has not been called'
+        
+        if delay is None:
+            delay = self._interval
+        if self._remainingrepeats == 0:
+            self._scheduler.add(self, 0)
+        else:
+            self._scheduler.add(self, delay)
+        
+    def _fire(self):
+        # private! Called by DGScheduler when this timer is due.
+        if self.__finished:
+            return
+        
+        missed = 0
+        if self._remainingrepeats != 0:
+            shed = False
+            policy = self._scheduler.policy
+            if policy != CATCHUP and self._interval > 0:
+                late = self._scheduler.late(self)
+                if policy == COALESCE:
+                    # intervals missed as a whole are counted as done by this
+                    # call, which may be the last one
+                    missed = int(late // self._interval)
+                    if self._remainingrepeats is not None:
+                        missed = min(missed, self._remainingrepeats - 1)
+                else:
+                    shed = self._priority < 0 and late >= SCHEDULER_SHED_LAG
+                if _dgstats.enabled:
+                    _dgstats.count('scheduler.coalesced', missed)
+                    _dgstats.count('scheduler.shed', shed)
             
             try:
-                if self._target:
+                if self._target and not shed:
                     self._target(*self._args, **self._kwargs)
             except TypeError:
                 pass
             
-            self._remainingrepeats -= 1
+            if self._remainingrepeats is not None:
+                self._remainingrepeats -= 1 + missed
+                
+        if self._remainingrepeats != 0:
+            if not self.__finished:
+                self._scheduler.repeat(self, self._interval * (1 + missed))
+            return
+        
         self.__finished = True
+        if self._endmessage:
+            self._bus.emit(DGMessageEvent(self._endmessage))
+        if self._endtarget:
+            self._endtarget(*self._eargs, **self._ekwargs)
         
     @property
     def remainingrepeats(self):
         """Returns the amount of repeats left
         
-        Throws RuntimeError if the thread has already been terminated.
+        Throws RuntimeError if the timer has already been terminated.
         """
         assert self.__initialized, 'DGScheduler.__init__() has not been called'
         if self.__finished:
@@ -110,12 +481,27 @@ class DGDelayedScheduler(_Thread):
             
         return self._remainingrepeats
     
+    @property
+    def remainingtime(self):
+        """Returns the time in seconds until the next call, or None if the
+        timer is not scheduled.
+        """
+        if self.__finished:
+            return None
+        return self._scheduler.remaining(self)
+    
     def cancel(self):
         """Stops the scheduler if it hasn't finished yet"""
         assert self.__initialized, 'DGScheduler.__init__() has not been called'
         
         self.__finished = True
+        self._scheduler.remove(self)
+        
         
+# Scheduler shared by every DGDelayedScheduler instance
+default_scheduler = DGScheduler()
+_dgstats.gauge('scheduler.timers', default_scheduler.__len__)
+
 def elect_key_with_modifier(target, preference, multiplier=10):
     """Chooses a pseudo-random key in dictionary, affected by preference
     
@@ -135,55 +521,609 @@ def elect_key_with_modifier(target, preference, multiplier=10):
     """
     assert isinstance(preference, dict), '*preference* should be a dictionary'
     
-    candidate = []
-    for key in preference.keys():
-        if preference[key] is target:
-            candidate.extend([key] * multiplier)
+    # every key weighs 1, or *multiplier* if it prefers *target*. Walking the
+    # weights picks the same key as indexing the list of keys repeated by
+    # their weights would, without building the list.
+    electors = 0
+    for value in preference.values():
+        if value is target:
+            electors += 1
+    rand_result = _randint(0, len(preference) + electors*(multiplier-1) - 1)
+    for key, value in preference.items():
+        if value is target:
+            rand_result -= multiplier
+        else:
+            rand_result -= 1
+        if rand_result < 0:
+            return key
+
+def elect_keys_with_modifier(targets, preference, multiplier=10):
+    """Chooses a key for every target in *targets* in a single pass over
+    *preference*.
+    
+    Each key is chosen with the same probabilities as
+    elect_key_with_modifier() would with the same arguments, and the draws are
+    independent of each other.
+    
+    Returns a list of elected keys, in the order of *targets*.
+    """
+    assert isinstance(preference, dict), '*preference* should be a dictionary'
+    assert multiplier >= 1, '*multiplier* should be at least 1'
+    
+    keys = []
+    electors = {}
+    for key, value in preference.items():
+        keys.append(key)
+        electors.setdefault(id(value), []).append(key)
+    
+    # a draw below len(keys) picks any key with weight 1, and the rest picks
+    # an elector of the target with the remaining weight of *multiplier*-1
+    elected = []
+    for target in targets:
+        target_electors = electors.get(id(target), ())
+        extra = multiplier - 1
+        rand_result = _randint(0, len(keys) + len(target_electors)*extra - 1)
+        if rand_result < len(keys):
+            elected.append(keys[rand_result])
         else:
-            candidate.append(key)
-    return candidate[_randint(0, len(candidate)-1)]
+            elected.append(target_electors[(rand_result-len(keys)) // extra])
+    return elected
 
-def allocate_jobs_to_players(professions, default_profession, vote):
+def allocate_jobs_to_players(professions, default_profession, vote,
+                             multiplier=10):
+    """Assigns a job to every player in *vote*.
+    
+    *professions* is a list of DGProfession instances, electing a player each
+    in the given order.
+    
+    *default_profession* is the DGProfession given to players left without a
+    job.
+    
+    *vote* is a dictionary of {<DGPlayer>: <voted profession>, ...}
+    
+    *multiplier* is passed on to the election. Refer to
+    elect_key_with_modifier().
+    
+    A profession elects a player with the same weights as
+    elect_key_with_modifier(). An essential profession only elects among the
+    players without a job yet, and is left unfilled once every player has
+    one. Other professions elect among every player, and are skipped if the
+    elected player already has a job.
+    
+    Returns a list of players in the order they were assigned.
+    """
     assert isinstance(vote, dict), '*vote* should be a dictionary'
+    started = _dgstats.start()
+    
+    players = list(vote.keys())
+    # id(voted profession) -> indices of the players who voted for it
+    electors = {}
+    for index, voted in enumerate(vote.values()):
+        electors.setdefault(id(voted), []).append(index)
     
-    # list of assigned players
+    assigned_players = _assign_jobs(players,
+                                    _elect_players(_election_plan(professions),
+                                                   len(players), electors,
+                                                   multiplier),
+                                    default_profession)
+    _dgstats.stop('allocation.players_seconds', started)
+    return assigned_players
+
+def _assign_jobs(players, elected, default_profession):
+    # private! Gives the jobs in *elected*, a list of (profession, index) as
+    # returned by _elect_players(), to *players*, and *default_profession* to
+    # the rest. Returns a list of players in the order they were assigned.
     assigned_players = []
+    assigned = bytearray(len(players))
     
-    for prof in professions:
-        player = elect_key_with_modifier(prof, vote)
+    for prof, index in elected:
+        player = players[index]
+        if isinstance(prof, DGProfessionSet):
+            prof = prof.choose_job()
+        player.job = prof
+        assigned[index] = True
+        assigned_players.append(player)
+    
+    for index, player in enumerate(players):
+        if not assigned[index]:
+            # professions are interned, so Unemployed() here is the same
+            # instance as the one in PROFESSIONS
+            player.job = default_profession
+            assigned_players.append(player)
+    return assigned_players
+
+class DGVoteBox(object):
+    """Collects the votes of a lobby as they come in, for
+    allocate_jobs_to_players().
+    
+    Every vote is filed at once in an inverted index of voted professions to
+    their voters, which also gives the number of votes of each profession.
+    allocate() then runs the election on the index as it is, instead of
+    building it from a whole vote dictionary.
+    
+    Once allocate() has run, the allocation is kept up to date as players
+    join, leave or change their votes. vote() and withdraw() then repair
+    only the jobs affected by the change, so that a lobby can go on with
+    its players coming and going without allocating every job again:
+    
+    - A job given up by a leaving player, or by a player changing its vote,
+      is elected again with the same rules and weights as in allocate(),
+      DGProfessionSets choosing a job with their odds. A player changing its
+      vote is left without a job until then, and may be elected again.
+    - An essential job given up that way is passed on even if every player
+      has a job, taking a player away from a non-essential job.
+    - Essential jobs left unfilled for want of players are filled as soon
+      as a player without a job joins.
+    
+    Voters are numbered in the order they first voted. A withdrawn voter
+    hands its number over to the last one, so that a change costs O(1) plus
+    the elections it causes.
+    """
+    def __init__(self, professions, default_profession, multiplier=10):
+        """*professions*, *default_profession* and *multiplier* are the same
+        as in allocate_jobs_to_players().
+        """
+        self._plan = _election_plan(professions)
+        self._default = default_profession
+        self._multiplier = multiplier
+        self._players = []
+        self._votes = []
+        # player -> number of the player, an index in _players
+        self._index = {}
+        # id(voted profession) -> numbers of the players who voted for it
+        self._electors = {}
+        # number of a player -> position in the electors of its vote
+        self._electorpos = []
+        self._lock = _Lock()
+        # the rest is only used once allocated
+        self._allocated = False
+        # number of a player -> index in _plan of the job it holds, or -1
+        self._slot = []
+        # index in _plan -> number of the player holding it, or None
+        self._holders = [None] * len(self._plan)
+        # numbers of players without a job from _plan, and their positions
+        self._pool = []
+        self._poolpos = []
+        # id(voted profession) -> numbers of its voters in _pool
+        self._free = {}
+        self._freepos = []
+        # indices in _plan of essential jobs left unfilled
+        self._vacant = set()
         
-        # part for ensuring jobs with essential=True to elect a non-assigned
-        # player. This implementation does not overwrite elected players,
-        # therefore is prone to cause unexpected results, such as infinite
-        # loops, if there's no unassigned player left
-        # the initial programmer was too lazy to fix this
-        if prof.essential:
-            while player in assigned_players:
-                player = elect_key_with_modifier(prof, vote)
+    def __len__(self):
+        return len(self._players)
+    
+    def __contains__(self, player):
+        return player in self._index
+    
+    def __iter__(self):
+        """Yields every player who has voted."""
+        return iter(list(self._players))
+    
+    @property
+    def allocated(self):
+        """Returns whether allocate() has been called."""
+        return self._allocated
+    
+    def get(self, player, default=None):
+        """Returns the vote of *player*, or *default* if it has not voted."""
+        index = self._index.get(player)
+        if index is None:
+            return default
+        return self._votes[index]
+    
+    def votes(self):
+        """Returns a vote dictionary of {<DGPlayer>: <vote>, ...}."""
+        with self._lock:
+            return dict(zip(self._players, self._votes))
+    
+    def count(self, vote):
+        """Returns the number of players who voted for *vote*."""
+        return len(self._electors.get(id(vote), ()))
+    
+    def counts(self):
+        """Returns a dictionary of {<vote>: <number of votes>, ...}."""
+        with self._lock:
+            votes = self._votes
+            return {votes[indices[0]]: len(indices)
+                    for indices in self._electors.values()}
+    
+    def voters(self, vote):
+        """Returns a list of players who voted for *vote*."""
+        with self._lock:
+            players = self._players
+            return [players[i] for i in self._electors.get(id(vote), ())]
+    
+    def vote(self, player, vote):
+        """Files *vote*, a value of a vote dictionary such as a DGProfession
+        or RANDOM_VOTE, for *player*, replacing its earlier vote if any.
         
-        if player not in assigned_players:
+        Once allocated, a new player starts with the default profession.
+        
+        Returns a list of players whose job has changed, which is always
+        empty before allocate().
+        """
+        with self._lock:
+            index = self._index.get(player)
+            if index is None:
+                index = len(self._players)
+                self._index[player] = index
+                self._players.append(player)
+                self._votes.append(vote)
+                self._electorpos.append(0)
+                self._slot.append(-1)
+                self._poolpos.append(0)
+                self._freepos.append(0)
+                self._file(index)
+                if not self._allocated:
+                    return []
+                self._enpool(index)
+                player.job = self._default
+                return [player] + self._repair(())
+            
+            if self._votes[index] is vote:
+                return []
+            slot = self._slot[index]
+            if self._allocated and slot < 0:
+                self._unpool(index)
+            self._unfile(index)
+            self._votes[index] = vote
+            self._file(index)
+            if not self._allocated:
+                return []
+            changed = []
+            if slot >= 0:
+                self._holders[slot] = None
+                player.job = self._default
+                changed.append(player)
+            self._slot[index] = -1
+            self._enpool(index)
+            return changed + self._repair((slot,) if slot >= 0 else ())
+    
+    def withdraw(self, player):
+        """Removes *player* and its vote.
+        
+        Returns a list of players whose job has changed, which is always
+        empty before allocate(). The job of *player* is left as it is.
+        
+        Raises KeyError if *player* has not voted.
+        """
+        with self._lock:
+            index = self._index.pop(player)
+            freed = ()
+            if self._allocated:
+                slot = self._slot[index]
+                if slot >= 0:
+                    self._holders[slot] = None
+                    freed = (slot,)
+                else:
+                    self._unpool(index)
+            self._unfile(index)
+            last = len(self._players) - 1
+            if index != last:
+                self._renumber(last, index)
+            for numbers in (self._players, self._votes, self._electorpos,
+                            self._slot, self._poolpos, self._freepos):
+                numbers.pop()
+            if not self._allocated:
+                return []
+            return self._repair(freed)
+    
+    def _renumber(self, old, new):
+        # private! Gives the number *new* to the player numbered *old*.
+        # Must be called with the lock held.
+        player = self._players[old]
+        self._players[new] = player
+        self._index[player] = new
+        vote = self._votes[new] = self._votes[old]
+        pos = self._electorpos[new] = self._electorpos[old]
+        self._electors[id(vote)][pos] = new
+        slot = self._slot[new] = self._slot[old]
+        if slot >= 0:
+            self._holders[slot] = new
+        elif self._allocated:
+            pos = self._poolpos[new] = self._poolpos[old]
+            self._pool[pos] = new
+            pos = self._freepos[new] = self._freepos[old]
+            self._free[id(vote)][pos] = new
+    
+    def _file(self, index):
+        # private! Adds the player numbered *index* to the electors of its
+        # vote. Must be called with the lock held.
+        electors = self._electors.setdefault(id(self._votes[index]), [])
+        self._electorpos[index] = len(electors)
+        electors.append(index)
+    
+    def _unfile(self, index):
+        # private! Removes the player numbered *index* from the electors of
+        # its vote. Must be called with the lock held.
+        key = id(self._votes[index])
+        electors = self._electors[key]
+        _swap_remove(electors, self._electorpos, self._electorpos[index])
+        if not electors:
+            del self._electors[key]
+    
+    def _enpool(self, index):
+        # private! Adds the player numbered *index* to the players without a
+        # job. Must be called with the lock held.
+        self._poolpos[index] = len(self._pool)
+        self._pool.append(index)
+        free = self._free.setdefault(id(self._votes[index]), [])
+        self._freepos[index] = len(free)
+        free.append(index)
+    
+    def _unpool(self, index):
+        # private! Removes the player numbered *index* from the players
+        # without a job. Must be called with the lock held.
+        _swap_remove(self._pool, self._poolpos, self._poolpos[index])
+        key = id(self._votes[index])
+        free = self._free[key]
+        _swap_remove(free, self._freepos, self._freepos[index])
+        if not free:
+            del self._free[key]
+    
+    def _elect(self, slot, passon=False):
+        # private! Elects a player for the job *slot* in _plan the same way
+        # as _elect_players() does, and gives it the job. An essential job
+        # takes a player from a non-essential job if *passon* is set and
+        # every player has a job.
+        #
+        # Returns the number of the elected player, or None if the job is
+        # left unfilled.
+        prof, key, essential = self._plan[slot]
+        if essential:
+            candidates = self._pool
+            prof_electors = self._free.get(key, ())
+            if not candidates and passon:
+                plan = self._plan
+                candidates = [i for s, i in enumerate(self._holders)
+                              if i is not None and not plan[s][2]]
+                prof_electors = [i for i in candidates
+                                 if id(self._votes[i]) == key]
+        else:
+            candidates = range(len(self._players))
+            prof_electors = self._electors.get(key, ())
+        if not candidates:
+            return None
+        
+        extra = self._multiplier - 1
+        rand_result = int(_random() * (len(candidates) +
+                                       len(prof_electors)*extra))
+        if rand_result < len(candidates):
+            index = candidates[rand_result]
+        else:
+            index = prof_electors[(rand_result-len(candidates)) // extra]
+        held = self._slot[index]
+        if held >= 0:
+            if not essential:
+                # elected player has a job already
+                return None
+            # passed on from a non-essential job, which is left unfilled
+            self._holders[held] = None
+            self._enpool(index)
+        
+        self._unpool(index)
+        self._slot[index] = slot
+        self._holders[slot] = index
+        if isinstance(prof, DGProfessionSet):
+            prof = prof.choose_job()
+        self._players[index].job = prof
+        return index
+    
+    def _repair(self, freed):
+        # private! Elects the jobs in *freed* again, along with unfilled
+        # essential jobs if any player is without a job, in the order of
+        # _plan. Returns a list of players whose job has changed.
+        slots = set(freed)
+        if self._pool:
+            slots |= self._vacant
+        changed = []
+        for slot in sorted(slots):
+            self._vacant.discard(slot)
+            index = self._elect(slot, slot in freed)
+            if index is None:
+                if self._plan[slot][2]:
+                    self._vacant.add(slot)
+            else:
+                changed.append(self._players[index])
+        if _dgstats.enabled:
+            _dgstats.count('allocation.repairs')
+            _dgstats.count('allocation.repaired_jobs', len(changed))
+        return changed
+    
+    def allocate(self):
+        """Assigns a job to every player who has voted, the same way as
+        allocate_jobs_to_players(), and starts keeping the allocation up to
+        date. Calling it again allocates every job again.
+        
+        Returns a list of players in the order they were assigned.
+        """
+        started = _dgstats.start()
+        with self._lock:
+            size = len(self._players)
+            self._allocated = True
+            self._slot = [-1] * size
+            self._holders = [None] * len(self._plan)
+            self._pool = list(range(size))
+            self._poolpos = list(range(size))
+            # every player is without a job, so the free electors are the
+            # electors themselves
+            self._free = {key: list(electors)
+                          for key, electors in self._electors.items()}
+            self._freepos = list(self._electorpos)
+            self._vacant = set()
+            
+            assigned_players = []
+            for slot, (prof, key, essential) in enumerate(self._plan):
+                index = self._elect(slot)
+                if index is not None:
+                    assigned_players.append(self._players[index])
+                elif essential:
+                    self._vacant.add(slot)
+            for index in self._pool:
+                player = self._players[index]
+                player.job = self._default
+                assigned_players.append(player)
+        _dgstats.stop('allocation.players_seconds', started)
+        return assigned_players
+
+def allocate_jobs_to_lobbies(professions, default_profession, votes,
+                             multiplier=10):
+    """Assigns jobs to the players of many lobbies at once.
+    
+    *professions*, *default_profession* and *multiplier* are the same as in
+    allocate_jobs_to_players().
+    
+    *votes* is an iterable of lobbies, each being a sequence of votes of its
+    players, such as an array.array or a list. A vote is an index in
+    *professions*, and any other number is a random vote.
+    
+    Every lobby runs the same election as allocate_jobs_to_players(), but on
+    player indices instead of DGPlayer instances. Elected DGProfessionSets are
+    then resolved for every lobby at once, with a single choose_jobs() call
+    per set.
+    
+    Returns a tuple of (jobs, assignments). *jobs* is a tuple of every
+    DGProfession that can be assigned. *assignments* is a list of
+    array.array, one per lobby, holding the index in *jobs* of the job of
+    each player.
+    """
+    started = _dgstats.start()
+    jobs = []
+    jobindex = {}
+    def addjob(job):
+        if id(job) not in jobindex:
+            jobindex[id(job)] = len(jobs)
+            jobs.append(job)
+        return jobindex[id(job)]
+    
+    for prof in professions:
+        if isinstance(prof, DGProfessionSet):
+            for job in prof.jobs():
+                addjob(job)
+        else:
+            addjob(prof)
+    default = addjob(default_profession)
+    
+    keys = [id(prof) for prof in professions]
+    plan = _election_plan(professions)
+    assignments = []
+    # id(DGProfessionSet) -> (set, [(assignment, player index), ...])
+    unresolved = {}
+    for lobby in votes:
+        electors = {}
+        for index, vote in enumerate(lobby):
+            if 0 <= vote < len(keys):
+                electors.setdefault(keys[vote], []).append(index)
+        
+        assignment = _array('H', (default,)) * len(lobby)
+        for prof, index in _elect_players(plan, len(lobby), electors,
+                                          multiplier):
             if isinstance(prof, DGProfessionSet):
-                prof = prof.choose_job()
-            player.job = prof
-            assigned_players.append(player)
+                unresolved.setdefault(id(prof), (prof, []))[1].append(
+                    (assignment, index))
+            else:
+                assignment[index] = jobindex[id(prof)]
+        assignments.append(assignment)
     
-    for player in vote.keys():
-        if player not in assigned_players:
-            # warning! creating a new instance of DGProfession like this could
-            # lead to unexpected results. keep in mind that every job instances
-            # other than this one has been already initialized in PROFESSIONS
-            player.job = default_profession
-            assigned_players.append(player)
+    for profset, players in unresolved.values():
+        for (assignment, index), job in zip(players,
+                                            profset.choose_jobs(len(players))):
+            assignment[index] = jobindex[id(job)]
     
-    return assigned_players
+    if started is not None:
+        _dgstats.count('allocation.lobbies', len(assignments))
+        _dgstats.stop('allocation.lobbies_seconds', started)
+    return tuple(jobs), assignments
+
+def _election_plan(professions):
+    # private! Returns a tuple of (profession, id, essential) for
+    # _elect_players(), so that a plan can be reused over many elections.
+    return tuple((prof, id(prof), prof.essential) for prof in professions)
+
+def _elect_players(plan, size, electors, multiplier):
+    # private! Runs the election of allocate_jobs_to_players() over player
+    # indices 0 to *size*-1, returning a list of (profession, index) pairs.
+    #
+    # *plan* is the result of _election_plan(). *electors* maps
+    # id(profession) to the indices of its voters. Players without a job are
+    # kept in a pool and in a list of free electors of the profession they
+    # voted for. Both are removed from by swapping with the
+    # last element, so every election is O(1) and the whole run is O(P + N).
+    extra = multiplier - 1
+    pool = list(range(size))
+    poolpos = list(range(size))
+    free_electors = {}
+    electorlist = [None] * size
+    electorpos = [0] * size
+    for key, indices in electors.items():
+        free_electors[key] = seq = list(indices)
+        for pos, index in enumerate(seq):
+            electorlist[index] = seq
+            electorpos[index] = pos
+    
+    elected = []
+    everyone = range(size)
+    unfilled = collisions = 0
+    for prof, key, essential in plan:
+        if essential:
+            candidates = pool
+            prof_electors = free_electors.get(key, ())
+        else:
+            candidates = everyone
+            prof_electors = electors.get(key, ())
+        if not candidates:
+            # every player has a job already
+            unfilled += essential
+            continue
+        
+        # int(random() * n) is a uniform integer below n, a few times cheaper
+        # than randint() on this path shared by every lobby
+        rand_result = int(_random() * (len(candidates) +
+                                       len(prof_electors)*extra))
+        if rand_result < len(candidates):
+            index = candidates[rand_result]
+        else:
+            index = prof_electors[(rand_result-len(candidates)) // extra]
+        if poolpos[index] is None:
+            # elected player has a job already
+            collisions += 1
+            continue
+        
+        _swap_remove(pool, poolpos, poolpos[index])
+        poolpos[index] = None
+        if electorlist[index] is not None:
+            _swap_remove(electorlist[index], electorpos, electorpos[index])
+            electorlist[index] = None
+        elected.append((prof, index))
+    
+    if _dgstats.enabled:
+        _dgstats.count('allocation.elections')
+        _dgstats.count('allocation.players', size)
+        _dgstats.count('allocation.unfilled_essentials', unfilled)
+        _dgstats.count('allocation.collisions', collisions)
+    return elected
+
+def _swap_remove(seq, positions, pos):
+    # private! Removes seq[pos] by moving the last element into its place,
+    # keeping *positions* of the elements in *seq* up to date.
+    last = seq.pop()
+    if pos < len(seq):
+        seq[pos] = last
+        positions[last] = pos
 
 def get_killer(player_list):
     """Finds all killers in the specified list
     
-    *player_list* is a list of DGPlayer instances
+    *player_list* is a list of DGPlayer instances, or a DGPlayerRegistry
+    such as DGPlayerTable.registry. Killers in a registry are looked up in
+    its index instead of checking every player.
     
     Returns a tuple containing all killers found.
     """
+    killers = getattr(player_list, 'killers', None)
+    if killers is not None:
+        return tuple(killers())
     killers = []
     for p in player_list:
         if p.iskiller:
@@ -198,20 +1138,150 @@ def eligible_itemuse(player, item):
     
     *item* is a DGItem instance
     
+    An item with killer_only set can only be used by killers, and an item
+    without user_jobs can be used by everyone. Otherwise the job of *player*
+    must be one of user_jobs.
+    
     Returns True if eligible, and False if not.
     """
-    if player.job.name in [j.name for j in item.user_jobs]:
+    if item.killer_only:
+        return player.iskiller
+    if not item.user_jobs:
         return True
-    else:
-        return False
+    return player.job is not None and player.job.id in item.user_job_ids
     
 # Self-test code
+def _check_votebox(votebox):
+    # Asserts that the indexes of *votebox*, once allocated, agree with each
+    # other and with the jobs of its players.
+    plan = votebox._plan
+    players = votebox._players
+    size = len(players)
+    for player, index in votebox._index.items():
+        assert players[index] is player
+    for key, electors in votebox._electors.items():
+        for pos, index in enumerate(electors):
+            assert votebox._electorpos[index] == pos
+            assert id(votebox._votes[index]) == key
+    assert sum(map(len, votebox._electors.values())) == size
+    # holders and slots
+    for slot, index in enumerate(votebox._holders):
+        if index is not None:
+            assert votebox._slot[index] == slot
+    for index in range(size):
+        slot = votebox._slot[index]
+        job = players[index].job
+        if slot < 0:
+            assert job is votebox._default
+            continue
+        assert votebox._holders[slot] == index
+        prof = plan[slot][0]
+        assert job is prof or (isinstance(prof, DGProfessionSet) and
+                               prof.odds(job))
+    # pool and its positions
+    assert sorted(votebox._pool) == \
+        [i for i in range(size) if votebox._slot[i] < 0]
+    for pos, index in enumerate(votebox._pool):
+        assert votebox._poolpos[index] == pos
+    for key, free in votebox._free.items():
+        assert free
+        for pos, index in enumerate(free):
+            assert votebox._freepos[index] == pos
+            assert votebox._slot[index] < 0
+            assert id(votebox._votes[index]) == key
+    assert sum(map(len, votebox._free.values())) == len(votebox._pool)
+    # no essential job is left unfilled while a player is without a job
+    if votebox._pool:
+        for slot, (prof, key, essential) in enumerate(plan):
+            assert not essential or votebox._holders[slot] is not None
+    for slot in votebox._vacant:
+        assert plan[slot][2] and votebox._holders[slot] is None
+
+def _test_votebox(lobbies=300, changes=60):
+    # Runs random joins, leaves and revotes on allocated DGVoteBoxes,
+    # checking their indexes after every change.
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.players.dgplayertable import DGPlayerTable
+    from detectivegame420.util.gamesettings import PROFESSIONS, RANDOM_VOTE
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+    
+    table = DGPlayerTable()
+    players = [DGPlayer(str(i), table=table) for i in range(30)]
+    votes = list(PROFESSIONS) + [RANDOM_VOTE]
+    for i in range(lobbies):
+        votebox = DGVoteBox(PROFESSIONS, Unemployed())
+        for player in players[:_randint(0, 12)]:
+            votebox.vote(player, votes[_randint(0, len(votes)-1)])
+        votebox.allocate()
+        _check_votebox(votebox)
+        for j in range(changes):
+            player = players[_randint(0, len(players)-1)]
+            if player in votebox and _random() < 0.4:
+                votebox.withdraw(player)
+            else:
+                votebox.vote(player, votes[_randint(0, len(votes)-1)])
+            _check_votebox(votebox)
+    print('DGVoteBox: {} lobbies, {} changes each, indexes consistent'.format(
+        lobbies, changes))
+
+def _allocate_by_rejection(professions, default_profession, vote):
+    # The rejection loop allocate_jobs_to_players() used before, for
+    # comparison. Loops forever unless a player is left without a job.
+    assigned_players = []
+    for prof in professions:
+        player = elect_key_with_modifier(prof, vote)
+        if prof.essential:
+            while player in assigned_players:
+                player = elect_key_with_modifier(prof, vote)
+        if player not in assigned_players:
+            if isinstance(prof, DGProfessionSet):
+                prof = prof.choose_job()
+            player.job = prof
+            assigned_players.append(player)
+    for player in vote.keys():
+        if player not in assigned_players:
+            player.job = default_profession
+            assigned_players.append(player)
+    return assigned_players
+
+def _test_allocation(trials=10000, tolerance=0.04):
+    # Checks that allocate_jobs_to_players() gives every player each job as
+    # often as the old rejection loop did.
+    from random import seed
+    from detectivegame420.players.dgplayer import DGPlayer
+    from detectivegame420.players.dgplayertable import DGPlayerTable
+    from detectivegame420.util.gamesettings import PROFESSIONS
+    from detectivegame420.professions.dgprofessionlist import Unemployed
+    
+    seed(420)
+    table = DGPlayerTable()
+    players = [DGPlayer(str(i), table=table) for i in range(12)]
+    vote = {p: PROFESSIONS[_randint(0, len(PROFESSIONS)-1)] for p in players}
+    
+    frequencies = []
+    for allocate in (allocate_jobs_to_players, _allocate_by_rejection):
+        counts = {}
+        for i in range(trials):
+            allocate(PROFESSIONS, Unemployed(), vote)
+            for index, player in enumerate(players):
+                key = (index, player.job.name)
+                counts[key] = counts.get(key, 0) + 1
+        frequencies.append(counts)
+    new, old = frequencies
+    worst = max(abs(new.get(key, 0) - old.get(key, 0)) / trials
+                for key in set(new) | set(old))
+    assert worst < tolerance, worst
+    print('allocate_jobs_to_players: {} trials, largest difference in job '
+          'frequency from the rejection loop {:.4f}'.format(trials, worst))
+
 def _test():
     from detectivegame420.players.dgplayer import DGPlayer
     from detectivegame420.util.gamesettings import PROFESSIONS
     
     player_list = [DGPlayer('Minjun Shin'), DGPlayer('Gree Oh')]
     print([p.name for p in player_list])
+    _test_votebox()
+    _test_allocation()
     
 if __name__ == '__main__':
     _test()
@@ -2,22 +2,42 @@
 
 """A module containing every constant used in detectivegame420 package"""
 
-from detectivegame420.professions.dgprofession import DGProfessionSet 
-from detectivegame420.professions.dgprofessionlist import *
+from threading import Lock as _Lock
 
 # main module constants
 RANDOM_VOTE = -1
-PROFESSIONS = [
-	# Necessary jobs are advised to go first
-	DGProfessionSet('Detective roles', {
-		Detective():25, Police():25,
-		Doctor():25, Student():25
-	}, essential=True),
-	DGProfessionSet('Soldier roles', {
-		Serviceman():75, DeltaForce():25
-	}),
-	Engineer(), Clerk(), Chef(), Unemployed()
-]
+# PROFESSIONS is built by _professions() on first access, see __getattr__()
+_professions_lock = _Lock()
+
+def _professions():
+	from detectivegame420.professions.dgprofession import DGProfessionSet
+	from detectivegame420.professions.dgprofessionlist import Detective, \
+		Police, Doctor, Student, Serviceman, DeltaForce, Engineer, Clerk, \
+		Chef, Unemployed
+
+	return [
+		# Necessary jobs are advised to go first
+		DGProfessionSet('Detective roles', {
+			Detective():25, Police():25,
+			Doctor():25, Student():25
+		}, essential=True),
+		DGProfessionSet('Soldier roles', {
+			Serviceman():75, DeltaForce():25
+		}),
+		Engineer(), Clerk(), Chef(), Unemployed()
+	]
+
+def __getattr__(name):
+	# Materializes PROFESSIONS on first access, so that importing constants
+	# does not import and instantiate every profession
+	if name == 'PROFESSIONS':
+		global PROFESSIONS
+		with _professions_lock:
+			if 'PROFESSIONS' not in globals():
+				PROFESSIONS = _professions()
+		return PROFESSIONS
+	raise AttributeError('module {!r} has no attribute {!r}'.format(
+		__name__, name))
 
 # DGPlayer constants
 SANITATION_LOWEST_INITVALUE = 50
@@ -28,5 +48,27 @@ SCOREDROP_SANITATION_COUNT = 5
 DRYING_TIME = 30.0
 SANITATION_SCOREDROP = -3
 
+# DGScoreLedger reason codes
+SCOREREASON_OTHER = 0
+SCOREREASON_SANITATION = 1
+SCOREREASON_ITEMUSE = 2
+
+# DGScheduler constants
+SCHEDULER_TICK = 0.05
+SCHEDULER_WHEEL_SIZE = 512
+# seconds a SHED scheduler may run late before skipping low priority timers
+SCHEDULER_SHED_LAG = 0.5
+
+# DGEventBus constants
+EVENTBUS_INTERVAL = 0.05
+
+# dgserver constants
+# seconds between health checks of workers
+SERVER_HEALTH_INTERVAL = 1.0
+# health checks a worker may fail in a row before being restarted
+SERVER_HEALTH_FAILURES = 3
+# largest frame accepted, in bytes
+SERVER_MAX_FRAME = 1 << 24
+
 # DGItem constants
 ITEMUSE_DEFAULT_SCORE = 5
\ No newline at end of file